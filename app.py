@@ -7,6 +7,7 @@ from PyQt5.QtCore import pyqtSlot, QThread, pyqtSignal, Qt
 from PyQt5.QtGui import QIcon
 
 from auth_dialog import AuthDialog
+from restore_dialog import RestoreDialog
 from widgets import SettingsWidget, LogWidget
 from scan_worker import ScanWorker
 from selection_dialog import FileSelectionDialog
@@ -26,6 +27,10 @@ class ImageBackupApp(QApplication):
 
 
 class MainWindow(QMainWindow):
+    # Сигналы для передачи событий из потока слежения в GUI-поток
+    watch_batch_ready = pyqtSignal(list)
+    watch_log_signal = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Image Backup Tool")
@@ -57,6 +62,15 @@ class MainWindow(QMainWindow):
         self.restore_btn.clicked.connect(self.restore_backup)
         button_layout.addWidget(self.restore_btn)
 
+        self.migrate_btn = QPushButton("Перенести в структуру")
+        self.migrate_btn.clicked.connect(self.migrate_layout)
+        button_layout.addWidget(self.migrate_btn)
+
+        self.watch_btn = QPushButton("Следить за папкой")
+        self.watch_btn.setCheckable(True)
+        self.watch_btn.toggled.connect(self.toggle_watch)
+        button_layout.addWidget(self.watch_btn)
+
         layout.addLayout(button_layout)
 
         # Загрузка настроек
@@ -77,6 +91,93 @@ class MainWindow(QMainWindow):
         self.commit_worker = None
         self.restore_thread = None
         self.restore_worker = None
+        self.migrate_thread = None
+        self.migrate_worker = None
+
+        # Слежение за папкой и очередь фиксаций
+        self.folder_watcher = None
+        self.pending_commits = []
+        self.watch_batch_ready.connect(self.commit_files)
+        # Сообщения из рабочих потоков идут сразу в буфер лога, минуя очередь событий
+        self.watch_log_signal.connect(self.log_widget.append_log, Qt.DirectConnection)
+
+        self.offer_resume()
+        self.resume_pushes()
+
+    @pyqtSlot(bool)
+    def toggle_watch(self, enabled):
+        """Включает или выключает слежение за папкой"""
+        try:
+            if enabled:
+                settings = self.settings_widget.get_settings()
+
+                if not settings['watch_folder']:
+                    self.log_widget.append_log("Ошибка: Укажите папку для слежения")
+                    self.watch_btn.setChecked(False)
+                    return
+
+                if not settings['repo_url']:
+                    self.log_widget.append_log("Ошибка: Укажите URL репозитория")
+                    self.watch_btn.setChecked(False)
+                    return
+
+                self.settings_widget.save_settings()
+
+                from folder_watcher import FolderWatcher
+                self.folder_watcher = FolderWatcher(settings, self.watch_batch_ready.emit,
+                                                    self.watch_log_signal)
+                if not self.folder_watcher.start():
+                    self.folder_watcher = None
+                    self.watch_btn.setChecked(False)
+                    return
+                self.watch_btn.setText("Остановить слежение")
+            else:
+                if self.folder_watcher:
+                    self.folder_watcher.stop()
+                    self.folder_watcher = None
+                self.watch_btn.setText("Следить за папкой")
+
+        except Exception as e:
+            self.log_widget.append_log(f"Ошибка слежения за папкой: {str(e)}")
+            self.log_widget.append_log(traceback.format_exc())
+            self.folder_watcher = None
+            self.watch_btn.setChecked(False)
+
+    def offer_resume(self):
+        """Предлагает продолжить фиксацию, прерванную в прошлый раз"""
+        try:
+            from commit_journal import CommitJournal, default_journal_path
+
+            pending = CommitJournal(default_journal_path()).pending()
+            if not pending:
+                return
+
+            answer = QMessageBox.question(
+                self, "Прерванная фиксация",
+                f"Предыдущая фиксация не завершена, осталось файлов: {len(pending)}.\n"
+                "Продолжить сейчас?")
+            if answer == QMessageBox.Yes:
+                # Оставшиеся файлы журнал добавит сам
+                self.commit_files([])
+            else:
+                self.log_widget.append_log(
+                    f"Незавершенная фиксация ({len(pending)} файлов) продолжится при следующей фиксации")
+        except Exception as e:
+            self.log_widget.append_log(f"Ошибка чтения журнала фиксации: {str(e)}")
+
+    def resume_pushes(self):
+        """Продолжает фоновую отправку коммитов, не отправленных в прошлый раз"""
+        try:
+            settings = self.settings_widget.get_settings()
+            if not settings['repo_url']:
+                return
+
+            from git_manager import GitManager
+
+            # Сигнал окна можно вызывать из потока отправки
+            GitManager.session(settings, self.watch_log_signal).resume_pushes()
+        except Exception as e:
+            self.log_widget.append_log(f"Ошибка проверки неотправленных коммитов: {str(e)}")
 
     @pyqtSlot()
     def show_auth_dialog(self):
@@ -115,7 +216,7 @@ class MainWindow(QMainWindow):
             self.scan_worker = ScanWorker(settings)
             self.scan_worker.moveToThread(self.scan_thread)
 
-            self.scan_worker.log_signal.connect(self.log_widget.append_log)
+            self.scan_worker.log_signal.connect(self.log_widget.append_log, Qt.DirectConnection)
             self.scan_worker.files_found.connect(self.on_files_found)
             self.scan_worker.finished.connect(self.on_scan_finished)
             # Добавляем обработчик для запроса аутентификации
@@ -156,7 +257,7 @@ class MainWindow(QMainWindow):
                 return
 
             # Показываем диалог выбора файлов в главном потоке
-            dialog = FileSelectionDialog(file_list, self)
+            dialog = FileSelectionDialog(file_list, self, self.settings_widget.get_settings())
             if dialog.exec_() == QDialog.Accepted:
                 selected_files = dialog.get_selected_files()
                 if selected_files:
@@ -171,23 +272,26 @@ class MainWindow(QMainWindow):
             self.log_widget.append_log(f"Ошибка при выборе файлов: {str(e)}")
             self.log_widget.append_log(traceback.format_exc())
 
+    @pyqtSlot(list)
     def commit_files(self, file_list):
         """Фиксирует выбранные файлы в репозитории"""
         try:
             settings = self.settings_widget.get_settings()
 
-            # Останавливаем предыдущий поток, если он есть
+            # Если фиксация уже идет, ставим файлы в очередь
             if self.commit_thread and self.commit_thread.isRunning():
-                self.commit_thread.quit()
-                self.commit_thread.wait()
+                self.pending_commits.append(file_list)
+                self.log_widget.append_log(f"Файлы поставлены в очередь на фиксацию: {len(file_list)}")
+                return
 
             # Запускаем фиксацию в отдельном потоке
             self.commit_thread = QThread()
             self.commit_worker = ScanWorker(settings)
             self.commit_worker.moveToThread(self.commit_thread)
 
-            self.commit_worker.log_signal.connect(self.log_widget.append_log)
+            self.commit_worker.log_signal.connect(self.log_widget.append_log, Qt.DirectConnection)
             self.commit_worker.finished.connect(self.on_commit_finished)
+            self.commit_worker.progress_signal.connect(self.log_widget.set_progress)
 
             # Передаем список файлов для фиксации
             self.commit_worker.set_files_to_commit(file_list)
@@ -209,6 +313,10 @@ class MainWindow(QMainWindow):
         self.commit_thread = None
         self.commit_worker = None
 
+        # Запускаем следующую пачку из очереди
+        if self.pending_commits:
+            self.commit_files(self.pending_commits.pop(0))
+
     @pyqtSlot()
     def restore_backup(self):
         """Восстанавливает изображения из репозитория"""
@@ -219,6 +327,12 @@ class MainWindow(QMainWindow):
                 self.log_widget.append_log("Ошибка: Укажите URL репозитория")
                 return
 
+            # Фильтры действуют только на этот запуск и в настройках не хранятся
+            dialog = RestoreDialog(self)
+            if dialog.exec_() != QDialog.Accepted:
+                return
+            settings.update(dialog.get_filters())
+
             # Останавливаем предыдущий поток, если он есть
             if self.restore_thread and self.restore_thread.isRunning():
                 self.restore_thread.quit()
@@ -229,7 +343,7 @@ class MainWindow(QMainWindow):
             self.restore_worker = ScanWorker(settings)
             self.restore_worker.moveToThread(self.restore_thread)
 
-            self.restore_worker.log_signal.connect(self.log_widget.append_log)
+            self.restore_worker.log_signal.connect(self.log_widget.append_log, Qt.DirectConnection)
             self.restore_worker.finished.connect(self.on_restore_finished)
 
             self.restore_thread.started.connect(self.restore_worker.restore)
@@ -251,4 +365,41 @@ class MainWindow(QMainWindow):
             self.restore_thread.quit()
             self.restore_thread.wait()
         self.restore_thread = None
-        self.restore_worker = None
\ No newline at end of file
+        self.restore_worker = None
+
+    @pyqtSlot()
+    def migrate_layout(self):
+        """Переносит файлы из корня репозитория в выбранную структуру"""
+        try:
+            settings = self.settings_widget.get_settings()
+
+            if not settings['repo_url']:
+                self.log_widget.append_log("Ошибка: Укажите URL репозитория")
+                return
+
+            self.migrate_thread = QThread()
+            self.migrate_worker = ScanWorker(settings)
+            self.migrate_worker.moveToThread(self.migrate_thread)
+
+            self.migrate_worker.log_signal.connect(self.log_widget.append_log, Qt.DirectConnection)
+            self.migrate_worker.auth_required.connect(self.handle_auth_required)
+            self.migrate_worker.finished.connect(self.on_migrate_finished)
+
+            self.migrate_thread.started.connect(self.migrate_worker.migrate)
+            self.migrate_thread.start()
+
+            self.migrate_btn.setEnabled(False)
+
+        except Exception as e:
+            self.log_widget.append_log(f"Ошибка при запуске переноса: {str(e)}")
+            self.log_widget.append_log(traceback.format_exc())
+
+    @pyqtSlot()
+    def on_migrate_finished(self):
+        """Вызывается при завершении переноса"""
+        self.migrate_btn.setEnabled(True)
+        if self.migrate_thread:
+            self.migrate_thread.quit()
+            self.migrate_thread.wait()
+        self.migrate_thread = None
+        self.migrate_worker = None
@@ -0,0 +1,124 @@
+"""Сравнение способов записи файлов в репозиторий: индекс и git fast-import.
+
+Создается локальный bare-репозиторий в роли удаленного и его клон.
+Один и тот же набор файлов записывается порциями сначала через рабочую
+копию и индекс (GitManager.stage_in_place), затем потоком fast-import
+(GitManager.stage_blobs), включая коммит и push каждой порции.
+
+    python benchmarks/bench_ingest.py --files 10000 --chunk 500
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import PROJECT_DIR  # noqa: F401 (добавляет корень проекта в sys.path)
+
+
+class NullLog:
+    def emit(self, message):
+        pass
+
+
+def make_manager(work_dir, name):
+    """Клон пустого bare-репозитория, подготовленный для GitManager"""
+    from git import Repo
+    from git_manager import GitManager
+
+    remote = os.path.join(work_dir, f"{name}_remote.git")
+    clone = os.path.join(work_dir, f"{name}_clone")
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'main', remote], check=True)
+    subprocess.run(['git', 'clone', '-q', remote, clone], check=True, capture_output=True)
+    for key, value in (('user.name', 'bench'), ('user.email', 'bench@localhost')):
+        subprocess.run(['git', 'config', key, value], cwd=clone, check=True)
+
+    # Каталог клона передается через настройки, чтобы обслуживание и
+    # очередь отправки работали с ним, а не с backup_repo проекта
+    manager = GitManager({'repo_url': remote, 'repo_path': clone}, NullLog())
+    manager.repo = Repo(clone)
+    return manager
+
+
+def make_blobs(count, size, seed):
+    rng = random.Random(seed)
+    return [(f"img_{i:06d}_compressed.webp", rng.randbytes(size)) for i in range(count)]
+
+
+def chunks(items, chunk_size):
+    for i in range(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+
+def first_push(manager):
+    """Первый push задает upstream для ветки"""
+    manager.repo.git.push('-u', 'origin', 'main')
+
+
+def run_index(manager, blobs, chunk_size):
+    start = time.perf_counter()
+    for number, chunk in enumerate(chunks(blobs, chunk_size)):
+        paths = []
+        for name, data in chunk:
+            path = os.path.join(manager.repo_path, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+        added = manager.stage_in_place(paths)
+        manager.commit_staged(len(added))
+        if number == 0:
+            first_push(manager)
+        else:
+            manager.push()
+    return time.perf_counter() - start
+
+
+def run_fast_import(manager, blobs, chunk_size):
+    start = time.perf_counter()
+    manager.start_fast_import()
+    for number, chunk in enumerate(chunks(blobs, chunk_size)):
+        added = manager.stage_blobs(chunk)
+        manager.commit_staged(len(added))
+        if number == 0:
+            first_push(manager)
+        else:
+            manager.push()
+    manager.finish_fast_import()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=64 * 1024, help="размер файла в байтах")
+    parser.add_argument('--chunk', type=int, default=500, help="файлов в коммите")
+    parser.add_argument('--json', help="сохранить результат в JSON-файл")
+    args = parser.parse_args()
+
+    blobs = make_blobs(args.files, args.size, seed=1)
+    total_mb = args.files * args.size / (1024 * 1024)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, run in (('index', run_index), ('fast-import', run_fast_import)):
+            seconds = run(make_manager(work_dir, name), blobs, args.chunk)
+            results[name] = {
+                'seconds': seconds,
+                'files_per_sec': args.files / seconds,
+                'mb_per_sec': total_mb / seconds,
+            }
+            print(f"{name:12} {seconds:8.2f} с  {args.files / seconds:8.1f} файлов/с  "
+                  f"{total_mb / seconds:7.1f} МБ/с")
+
+    print(f"ускорение fast-import x{results['index']['seconds'] / results['fast-import']['seconds']:.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Бенчмарк сжатия изображений (image_processor.encode_image).
+
+Генерирует воспроизводимый синтетический набор (разные разрешения,
+режимы RGB/RGBA/P/L, шум и градиенты) и прогоняет его через все
+сочетания формата, качества и уменьшения. Каждое сочетание замеряется
+в отдельном процессе: изображений в секунду, МБ/с исходных данных,
+пиковая память и отношение размера результата к исходнику.
+
+    python benchmarks/bench_processing.py --output results.json
+    python benchmarks/bench_processing.py --output new.json --compare results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import PROJECT_DIR, format_mb, make_photo_like, peak_rss_mb, run_isolated, seeded_noise
+
+RESOLUTIONS = ((640, 480), (1920, 1080), (4000, 3000))
+QUICK_RESOLUTIONS = ((320, 240), (1280, 720))
+MODES = ('RGB', 'RGBA', 'P', 'L')
+CONTENTS = ('noise', 'gradient')
+QUALITIES = (60, 85)
+RESIZES = (None, 1920)
+
+# Падение скорости больше этой доли при сравнении считается регрессией
+REGRESSION_THRESHOLD = 0.10
+
+
+def make_image(size, mode, content, seed):
+    from PIL import Image
+
+    if content == 'noise':
+        bands = [seeded_noise(size, seed + band) for band in range(3)]
+        img = Image.merge('RGB', bands)
+    else:
+        img = make_photo_like(size, seed)
+
+    if mode == 'RGBA':
+        img = img.convert('RGBA')
+        img.putalpha(Image.linear_gradient('L').resize(size))
+    elif mode == 'P':
+        img = img.convert('P', palette=Image.Palette.ADAPTIVE, colors=256)
+    elif mode == 'L':
+        img = img.convert('L')
+    return img
+
+
+def make_corpus(corpus_dir, resolutions):
+    """Создает набор PNG-файлов, одинаковый от запуска к запуску"""
+    paths = []
+    combos = itertools.product(resolutions, MODES, CONTENTS)
+    for seed, (size, mode, content) in enumerate(combos):
+        path = os.path.join(corpus_dir, f"{size[0]}x{size[1]}_{mode}_{content}.png")
+        make_image(size, mode, content, seed).save(path, 'PNG')
+        paths.append(path)
+    return paths
+
+
+def run_worker(config_json, output_dir, paths):
+    """Дочерний процесс: сжимает набор с одной конфигурацией и печатает замеры"""
+    from image_processor import encode_image
+
+    config = json.loads(config_json)
+    settings = {
+        'compression_format': config['format'],
+        'compression_quality': config['quality'],
+        'resize_enabled': config['max_size'] is not None,
+        'max_size': config['max_size'] or 0,
+        'effort': config['effort'],
+    }
+
+    input_bytes = 0
+    output_bytes = 0
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        output_path = os.path.join(output_dir, f"{i}.{config['format']}")
+        encode_image(path, output_path, settings)
+        input_bytes += os.path.getsize(path)
+        output_bytes += os.path.getsize(output_path)
+        os.remove(output_path)
+    seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        'seconds': seconds,
+        'images_per_sec': len(paths) / seconds,
+        'mb_per_sec': input_bytes / (1024 * 1024) / seconds,
+        'peak_rss_mb': peak_rss_mb(),
+        'size_ratio': output_bytes / input_bytes,
+    }))
+
+
+def available_formats():
+    from PIL import features
+
+    formats = ['webp', 'jpeg']
+    if features.check('avif'):
+        formats.append('avif')
+    return formats
+
+
+def environment():
+    import PIL
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                  capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def config_key(config):
+    return (config['format'], config['quality'], config['max_size'], config['effort'])
+
+
+def compare(results, baseline_path):
+    """Сравнивает скорость с предыдущим прогоном, возвращает число регрессий"""
+    with open(baseline_path) as f:
+        baseline = {config_key(item['config']): item for item in json.load(f)['results']}
+
+    regressions = 0
+    for item in results:
+        old = baseline.get(config_key(item['config']))
+        if old is None:
+            continue
+        change = item['images_per_sec'] / old['images_per_sec'] - 1
+        mark = ''
+        if change < -REGRESSION_THRESHOLD:
+            mark = '  РЕГРЕССИЯ'
+            regressions += 1
+        print(f"{format_config(item['config']):40} {change:+7.1%}{mark}")
+    return regressions
+
+
+def format_config(config):
+    resize = config['max_size'] or 'orig'
+    return f"{config['format']} q{config['quality']} {resize} {config['effort']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="маленькие изображения для быстрой проверки")
+    parser.add_argument('--formats', nargs='+', help="форматы (по умолчанию все доступные)")
+    parser.add_argument('--effort', nargs='+', default=['balanced'], help="уровни усилия кодировщика")
+    parser.add_argument('--output', help="сохранить результаты в JSON-файл")
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--worker', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        config_json, output_dir, *paths = args.worker
+        run_worker(config_json, output_dir, paths)
+        return 0
+
+    formats = args.formats or available_formats()
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus_dir = os.path.join(work_dir, 'corpus')
+        output_dir = os.path.join(work_dir, 'output')
+        os.makedirs(corpus_dir)
+        os.makedirs(output_dir)
+        paths = make_corpus(corpus_dir, QUICK_RESOLUTIONS if args.quick else RESOLUTIONS)
+
+        for fmt, quality, max_size, effort in itertools.product(formats, QUALITIES, RESIZES, args.effort):
+            config = {'format': fmt, 'quality': quality, 'max_size': max_size, 'effort': effort}
+            measured = run_isolated(__file__, ['--worker', json.dumps(config), output_dir] + paths)
+            results.append(dict(measured, config=config))
+            print(f"{format_config(config):40} {measured['images_per_sec']:7.2f} изобр/с "
+                  f"{measured['mb_per_sec']:7.2f} МБ/с  пик {format_mb(measured['peak_rss_mb']):>7} МБ  "
+                  f"размер x{measured['size_ratio']:.3f}")
+
+    report = {'environment': environment(), 'corpus_images': len(paths), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare and compare(results, args.compare):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
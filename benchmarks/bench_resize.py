@@ -0,0 +1,116 @@
+"""Сравнение точного и быстрого пути уменьшения изображений.
+
+Точный путь - прежний thumbnail(LANCZOS), быстрый - draft (DCT-масштаб
+JPEG) и reduce с reducing_gap (см. image_processor.prepare_image).
+Для каждого пути замеряются время и пиковая память в отдельном процессе,
+качество сравнивается по PSNR результатов.
+
+    python benchmarks/bench_resize.py --count 5 --size 6000x4000 --max-size 1920
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import format_mb, make_photo_like, peak_rss_mb, psnr, run_isolated
+
+
+def run_worker(mode, output_dir, max_size, paths):
+    """Дочерний процесс: уменьшает файлы одним из путей и печатает замеры"""
+    from PIL import Image
+    from image_processor import prepare_image
+
+    settings = {'resize_enabled': True, 'max_size': max_size, 'fast_resize': mode == 'fast'}
+    os.makedirs(output_dir, exist_ok=True)
+
+    seconds = 0.0
+    for i, path in enumerate(paths):
+        start = time.perf_counter()
+        with Image.open(path) as img:
+            img = prepare_image(img, settings)
+            img.load()
+        seconds += time.perf_counter() - start
+        img.save(os.path.join(output_dir, f"{i}.png"))
+
+    print(json.dumps({'seconds': seconds, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def make_corpus(corpus_dir, count, size):
+    paths = []
+    for i in range(count):
+        path = os.path.join(corpus_dir, f"photo_{i}.jpg")
+        make_photo_like(size, seed=i).save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=5, help="число синтетических снимков")
+    parser.add_argument('--size', default='6000x4000', help="размер синтетических снимков, ШxВ")
+    parser.add_argument('--max-size', type=int, default=1920, help="целевой максимальный размер")
+    parser.add_argument('--corpus', help="каталог со своими JPEG вместо синтетических")
+    parser.add_argument('--min-psnr', type=float, default=35.0, help="допустимый минимум PSNR, дБ")
+    parser.add_argument('--json', help="сохранить результат в JSON-файл")
+    parser.add_argument('--worker', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, output_dir, max_size, *paths = args.worker
+        run_worker(mode, output_dir, int(max_size), paths)
+        return 0
+
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if args.corpus:
+            paths = sorted(
+                os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                if name.lower().endswith(('.jpg', '.jpeg'))
+            )
+        else:
+            width, height = (int(value) for value in args.size.lower().split('x'))
+            paths = make_corpus(work_dir, args.count, (width, height))
+
+        results = {}
+        for mode in ('precise', 'fast'):
+            output_dir = os.path.join(work_dir, mode)
+            results[mode] = run_isolated(__file__, ['--worker', mode, output_dir, args.max_size] + paths)
+
+        scores = []
+        for i in range(len(paths)):
+            with Image.open(os.path.join(work_dir, 'precise', f"{i}.png")) as precise, \
+                    Image.open(os.path.join(work_dir, 'fast', f"{i}.png")) as fast:
+                if fast.size != precise.size:
+                    fast = fast.resize(precise.size, Image.Resampling.LANCZOS)
+                scores.append(psnr(precise, fast))
+
+    report = {
+        'images': len(paths),
+        'max_size': args.max_size,
+        'precise': results['precise'],
+        'fast': results['fast'],
+        'speedup': results['precise']['seconds'] / max(results['fast']['seconds'], 1e-9),
+        'psnr_min': min(scores),
+        'psnr_mean': sum(scores) / len(scores),
+    }
+
+    for mode in ('precise', 'fast'):
+        print(f"{mode:8} {report[mode]['seconds']:8.2f} с  пик памяти {format_mb(report[mode]['peak_rss_mb'])} МБ")
+    print(f"ускорение x{report['speedup']:.2f}, PSNR мин {report['psnr_min']:.1f} дБ, "
+          f"средн {report['psnr_mean']:.1f} дБ")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['psnr_min'] < args.min_psnr:
+        print(f"PSNR ниже допустимого {args.min_psnr} дБ", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
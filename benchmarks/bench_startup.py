@@ -0,0 +1,56 @@
+"""Время холодного старта командной строки в сравнении с GUI.
+
+Замеряется запуск нового интерпретатора с импортом модулей, которые
+нужны каждой точке входа, а также `cli.py --help` целиком.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from common import PROJECT_DIR
+
+CASES = {
+    'python': "pass",
+    'cli': "import cli",
+    'cli_scan': "import cli, scan_worker",
+    'cli_commit': "import cli, scan_worker, git_manager, image_processor",
+    'gui': "import app",
+}
+
+
+def measure(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=PROJECT_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(timings) * 1000, 'min_ms': min(timings) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', help="сохранить результат в JSON-файл")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in CASES.items():
+        results[name] = measure([sys.executable, '-c', code], args.runs)
+    results['cli_help'] = measure([sys.executable, 'cli.py', '--help'], args.runs)
+
+    for name, result in results.items():
+        print(f"{name:12} медиана {result['median_ms']:7.1f} мс  минимум {result['min_ms']:7.1f} мс")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Общие функции для бенчмарков.
+
+Бенчмарки запускаются из корня проекта, например:
+    python benchmarks/bench_resize.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Модули приложения лежат в корне проекта
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_DIR not in sys.path:
+    sys.path.insert(0, PROJECT_DIR)
+
+
+def peak_rss_mb():
+    """Пиковое потребление памяти текущим процессом в МБ (None, если неизвестно)"""
+    # В Linux ru_maxrss наследуется через fork+exec от родителя, а VmHWM - нет
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+def format_mb(value):
+    """Форматирует пиковую память для вывода в таблицу"""
+    if value is None:
+        return "н/д"
+    return f"{value:.1f}"
+
+
+def run_isolated(script, args):
+    """Запускает замер в отдельном процессе, чтобы пиковая память не смешивалась.
+
+    Дочерний процесс должен напечатать JSON последней строкой вывода.
+    """
+    output = subprocess.run(
+        [sys.executable, script] + [str(arg) for arg in args],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def seeded_noise(size, seed):
+    """Равномерный шум в режиме L, одинаковый при одном и том же seed"""
+    import random
+    from PIL import Image
+
+    data = random.Random(seed).randbytes(size[0] * size[1])
+    return Image.frombytes('L', size, data)
+
+
+def make_photo_like(size, seed):
+    """Синтетическое "фото": градиенты с шумом, воспроизводимо по seed"""
+    from PIL import Image, ImageChops
+
+    width, height = size
+    gradient = Image.linear_gradient('L').resize(size)
+    radial = Image.radial_gradient('L').resize(size)
+    noise = ImageChops.multiply(seeded_noise(size, seed), radial)
+    # Сдвигаем каналы по-разному, чтобы картинка не была серой
+    red = ImageChops.add(gradient, noise, scale=1.5)
+    green = ImageChops.offset(radial, seed * 37 % width, seed * 53 % height)
+    blue = ImageChops.blend(gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise, 0.3)
+    return Image.merge('RGB', (red, green, blue))
+
+
+def psnr(first, second):
+    """PSNR между двумя изображениями одного размера, дБ"""
+    import math
+    from PIL import ImageChops, ImageStat
+
+    diff = ImageChops.difference(first.convert('RGB'), second.convert('RGB'))
+    mse = sum(ImageStat.Stat(diff).sum2) / (3 * first.size[0] * first.size[1])
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
@@ -0,0 +1,162 @@
+import fnmatch
+import os
+import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from fast_import import blob_sha
+
+
+def split_patterns(value):
+    """Шаблоны путей из настройки: через ';' или с новой строки"""
+    return [pattern.strip() for pattern in re.split(r'[;\n]', value or '') if pattern.strip()]
+
+
+def match_path(path, patterns):
+    """Путь подходит под glob-шаблон или лежит в указанном каталоге"""
+    for pattern in patterns:
+        pattern = pattern.strip('/')
+        if fnmatch.fnmatchcase(path, pattern) or path.startswith(pattern + '/'):
+            return True
+    return False
+
+
+def tree_entries(repo, commit):
+    """Все файлы коммита: путь -> sha объекта blob"""
+    entries = {}
+    output = repo.git.ls_tree('-r', '-z', '--full-tree', commit)
+    for record in output.split('\0'):
+        if not record:
+            continue
+        info, path = record.split('\t', 1)
+        _, obj_type, sha = info.split()
+        if obj_type == 'blob':
+            entries[path] = sha
+    return entries
+
+
+def filter_paths(repo, commit, paths, patterns=(), since=None, until=None):
+    """Оставляет пути, подходящие под шаблоны и измененные в заданный период.
+
+    since/until - даты в любом понятном git формате ("2023-05-01",
+    "2 weeks ago"); учитываются коммиты, доступные в клоне.
+    """
+    if patterns:
+        paths = [path for path in paths if match_path(path, patterns)]
+
+    if paths and (since or until):
+        args = ['--format=', '--name-only', '-z', '--no-renames']
+        if since:
+            # --since прекращает обход на первом старом коммите, а даты коммитов
+            # в истории не обязательно упорядочены
+            args.append(f"--since-as-filter={since}")
+        if until:
+            args.append(f"--until={until}")
+        output = repo.git.log(*args, commit)
+        touched = {path.strip('\n') for path in output.split('\0')}
+        paths = [path for path in paths if path in touched]
+    return paths
+
+
+def prefetch_blobs(repo, commit, shas, batch_size=1000):
+    """Догружает отсутствующие в частичном клоне объекты пачками.
+
+    Без этого cat-file запрашивал бы у сервера каждый blob отдельно.
+    Возвращает число запрошенных объектов.
+    """
+    if repo.git.config('--get', 'remote.origin.promisor', with_exceptions=False) != 'true':
+        return 0
+
+    output = repo.git.rev_list('--objects', '--no-walk', '--missing=print', commit)
+    missing = {line[1:] for line in output.splitlines() if line.startswith('?')}
+    wanted = sorted(missing.intersection(shas))
+
+    for i in range(0, len(wanted), batch_size):
+        # Согласование истории не нужно: запрашиваются конкретные объекты
+        repo.git(c='fetch.negotiationAlgorithm=noop').fetch(
+            'origin', '--no-tags', '--no-write-fetch-head', '--recurse-submodules=no',
+            '--filter=blob:none', *wanted[i:i + batch_size])
+    return len(wanted)
+
+
+class CatFileBatch:
+    """Постоянный процесс git cat-file --batch.
+
+    Объекты читаются по одному каналу, без запуска git на каждый файл.
+    """
+
+    def __init__(self, repo_dir):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_dir,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha):
+        self.process.stdin.write(sha.encode() + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(f"Объект {sha} не найден")
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)  # перевод строки после содержимого
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _same_file(file_path, sha):
+    try:
+        with open(file_path, 'rb') as f:
+            return blob_sha(f.read()) == sha
+    except OSError:
+        return False
+
+
+def _write_file(file_path, data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def skip_existing(entries, target_dir, workers):
+    """Убирает пары (путь, sha), уже восстановленные с тем же содержимым"""
+    candidates = [(path, sha) for path, sha in entries
+                  if os.path.exists(os.path.join(target_dir, path))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        same = pool.map(lambda entry: _same_file(os.path.join(target_dir, entry[0]), entry[1]),
+                        candidates)
+        existing = {entry for entry, is_same in zip(candidates, same) if is_same}
+    return [entry for entry in entries if entry not in existing]
+
+
+def stream_blobs(repo_dir, entries, target_dir, workers):
+    """Пишет объекты blob сразу в target_dir, минуя рабочую копию.
+
+    Содержимое читается последовательно из cat-file, а запись файлов
+    идет в пуле потоков. Одновременно в памяти не больше workers * 2
+    файлов. Возвращает число записанных файлов.
+    """
+    max_pending = workers * 2
+    written = 0
+    with CatFileBatch(repo_dir) as reader, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path, sha in entries:
+            data = reader.read(sha)
+            pending.add(pool.submit(_write_file, os.path.join(target_dir, path), data))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                    written += 1
+        for future in pending:
+            future.result()
+            written += 1
+    return written
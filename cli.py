@@ -0,0 +1,220 @@
+"""Командная строка без графического интерфейса.
+
+    python main.py scan
+    python main.py commit [ФАЙЛ ...]
+    python main.py restore
+    python main.py watch
+    python main.py migrate
+
+По умолчанию используются настройки, сохраненные в GUI; отдельные
+значения можно переопределить ключами. QApplication не создается, а
+Pillow и GitPython загружаются только командами, которым они нужны.
+"""
+import argparse
+import queue
+import sys
+import time
+
+
+COMMANDS = ('scan', 'commit', 'restore', 'watch', 'migrate')
+
+# Фильтры восстановления не сохраняются и берутся только из аргументов
+RESTORE_FILTERS = ('restore_paths', 'restore_since', 'restore_until')
+
+
+class ConsoleLog:
+    """Замена log_signal: печатает сообщения в консоль"""
+
+    # Прогресс печатается не чаще раза в столько секунд
+    PROGRESS_INTERVAL = 5
+
+    def __init__(self):
+        self.last_progress = 0
+
+    def emit(self, message):
+        print(f"{time.strftime('%H:%M:%S')}: {message}", flush=True)
+
+    def progress(self, progress):
+        from progress import format_progress
+
+        now = time.monotonic()
+        if progress['done'] >= progress['total'] or now - self.last_progress >= self.PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.emit(f"Обработано: {format_progress(progress)}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="image_backup", description="Image Backup Tool без GUI")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--folder', dest='watch_folder', help="папка с изображениями")
+    common.add_argument('--repo-url', dest='repo_url', help="URL Git репозитория")
+    common.add_argument('--format', dest='compression_format', choices=['webp', 'jpeg', 'avif'])
+    common.add_argument('--quality', dest='compression_quality', type=int)
+    common.add_argument('--effort', choices=['fast', 'balanced', 'max', 'auto'])
+    common.add_argument('--max-size', dest='max_size', type=int, help="включает уменьшение до размера")
+    common.add_argument('--workers', type=int, help="число процессов сжатия")
+    common.add_argument('--memory-budget', dest='memory_budget_mb', type=int,
+                        help="память на декодирование в МБ (0 - без ограничения)")
+    common.add_argument('--layout', dest='repo_layout', choices=['flat', 'relative', 'date', 'hash'],
+                        help="структура файлов в репозитории")
+    common.add_argument('--full-rescan', dest='full_rescan', action='store_const', const=True,
+                        help="не использовать индекс: найти все изображения, включая зафиксированные")
+    common.add_argument('--profile', dest='profiling', action='store_const', const=True,
+                        help="сохранить профиль cProfile и отчет tracemalloc в logs/profiles")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('scan', parents=[common], help="показать новые и измененные изображения")
+    commit = subparsers.add_parser('commit', parents=[common],
+                                   help="сжать и зафиксировать файлы (по умолчанию все найденные)")
+    commit.add_argument('files', nargs='*')
+    restore = subparsers.add_parser('restore', parents=[common], help="восстановить изображения из репозитория")
+    restore.add_argument('--link-mode', dest='restore_link_mode', choices=['auto', 'hardlink', 'copy'],
+                         help="способ копирования файлов из рабочей копии")
+    restore.add_argument('--stream', dest='restore_mode', action='store_const', const='stream',
+                         help="писать файлы прямо из объектов git, без рабочей копии")
+    restore.add_argument('--path', dest='restore_paths', action='append',
+                         help="glob-шаблон или каталог (можно повторять)")
+    restore.add_argument('--since', dest='restore_since', help="только файлы, измененные с даты")
+    restore.add_argument('--until', dest='restore_until', help="только файлы, измененные до даты")
+    subparsers.add_parser('watch', parents=[common], help="следить за папкой и фиксировать новые файлы")
+    subparsers.add_parser('migrate', parents=[common],
+                          help="перенести файлы из корня репозитория в структуру --layout")
+    return parser
+
+
+def make_settings(args):
+    from settings_store import load_settings
+
+    settings = load_settings()
+    for key in settings:
+        value = getattr(args, key, None)
+        if isinstance(value, list):
+            value = ';'.join(value)
+        if value is not None:
+            settings[key] = value
+    if args.max_size is not None:
+        settings['resize_enabled'] = True
+    for key in RESTORE_FILTERS:
+        value = getattr(args, key, None)
+        settings[key] = ';'.join(value) if isinstance(value, list) else value or ""
+    return settings
+
+
+def exit_code(result):
+    """Код выхода по итогу операции: 0 - успех, 2 - нужна аутентификация, 1 - ошибка.
+
+    'partial' (часть файлов не обработана) тоже дает 1.
+    """
+    if result == 'auth_required':
+        return 2
+    return 0 if result and result != 'partial' else 1
+
+
+def make_worker(settings, log):
+    """Создает ScanWorker и подключает его сигналы к консоли (без QApplication)"""
+    from scan_worker import ScanWorker
+
+    worker = ScanWorker(settings)
+    worker.log_signal.connect(log.emit)
+    worker.progress_signal.connect(log.progress)
+    worker.auth_required.connect(
+        lambda: log.emit("Требуется аутентификация: сохраните учетные данные в GUI"))
+    return worker
+
+
+def run_scan(settings, log):
+    worker = make_worker(settings, log)
+    found = []
+    worker.files_found.connect(found.extend)
+    worker.scan()
+    return found
+
+
+def run_commit(settings, log, files, flush=True):
+    worker = make_worker(settings, log)
+    worker.set_files_to_commit(files)
+    worker.commit_files()
+    result = worker.result
+    if flush and result in (True, 'partial'):
+        # Зафиксированные файлы отправляются, даже если часть не обработана
+        pushed = flush_pushes(settings, log)
+        if result is True or pushed is not True:
+            result = pushed
+    return exit_code(result)
+
+
+def flush_pushes(settings, log):
+    """Отправляет коммиты из фоновой очереди до выхода из процесса.
+
+    Без сети коммиты останутся в репозитории и отправятся при следующем запуске.
+    """
+    from git_manager import GitManager
+
+    # Сообщения фоновой отправки печатаются сразу, без цикла событий Qt
+    git_manager = GitManager.session(settings, log)
+    git_manager.resume_pushes()
+    if git_manager.repo is None or not settings.get('background_push', True):
+        return True
+    return git_manager.push_queue.push_now()
+
+
+def run_watch(settings, log):
+    from folder_watcher import FolderWatcher
+
+    batches = queue.Queue()
+    watcher = FolderWatcher(settings, batches.put, log)
+    if not watcher.start():
+        return 1
+
+    # Пачки фиксируются по очереди в основном потоке
+    try:
+        while True:
+            try:
+                batch = batches.get(timeout=1)
+            except queue.Empty:
+                continue
+            run_commit(settings, log, batch, flush=False)
+    except KeyboardInterrupt:
+        watcher.stop()
+        while not batches.empty():
+            run_commit(settings, log, batches.get(), flush=False)
+        flush_pushes(settings, log)
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = make_settings(args)
+    log = ConsoleLog()
+
+    if args.command != 'restore' and not settings['watch_folder']:
+        log.emit("Ошибка: Укажите папку для сканирования (--folder)")
+        return 1
+    if args.command != 'scan' and not settings['repo_url']:
+        log.emit("Ошибка: Укажите URL репозитория (--repo-url)")
+        return 1
+
+    if args.command == 'scan':
+        for file_path in run_scan(settings, log):
+            print(file_path)
+        return 0
+
+    if args.command == 'commit':
+        files = args.files or run_scan(settings, log)
+        return run_commit(settings, log, files)
+
+    if args.command == 'restore':
+        worker = make_worker(settings, log)
+        worker.restore()
+        return exit_code(worker.result)
+
+    if args.command == 'migrate':
+        worker = make_worker(settings, log)
+        worker.migrate()
+        return exit_code(worker.result)
+
+    return run_watch(settings, log)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import json
+import os
+
+
+def default_journal_path():
+    """Путь к журналу рядом с приложением (как и backup_repo)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "commit_journal.jsonl")
+
+
+class CommitJournal:
+    """Журнал фиксации для продолжения прерванного запуска.
+
+    Первая строка файла - полный список исходников запуска, каждая
+    следующая - исходники очередной зафиксированной порции. Файл только
+    дописывается, поэтому отметка порции стоит одной короткой записи.
+    После успешного завершения журнал удаляется.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def pending(self):
+        """Исходники прерванного запуска, которые еще не зафиксированы"""
+        if not os.path.exists(self.path):
+            return []
+
+        files = []
+        done = set()
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Последняя строка могла не дописаться при сбое
+                    continue
+                if 'files' in record:
+                    files = record['files']
+                else:
+                    done.update(record.get('done', []))
+        return [file_path for file_path in files if file_path not in done]
+
+    def start(self, file_paths):
+        """Начинает запуск: добавляет к новым файлам недоделанные из журнала"""
+        pending = self.pending()
+        files = list(dict.fromkeys(pending + list(file_paths)))
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'files': files}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+        return files, len(pending)
+
+    def mark_done(self, file_paths):
+        """Отмечает порцию исходников как зафиксированную"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'done': list(file_paths)}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def finish(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,217 @@
+import os
+import queue
+import threading
+
+from image_processor import in_memory_result
+from progress import ProgressTracker
+from repo_layout import layout_path
+
+
+class CommitPipeline:
+    """Потоковая фиксация: сжатие -> копирование в репозиторий -> коммит.
+
+    Сжатые файлы попадают в ограниченную очередь и индексируются отдельным
+    потоком, пока пул процессов кодирует следующие. Коммиты создаются
+    каждые commit_batch_size файлов, а не один раз в конце. Временные
+    сжатые файлы удаляются сразу после копирования, поэтому на диске
+    одновременно лежит лишь ограниченное их число. В режиме direct_output
+    файлы кодируются сразу в рабочую копию и временных файлов нет вовсе.
+
+    Порция для коммита ограничена числом файлов (commit_batch_size) и
+    объемом (commit_batch_mb). После каждого коммита вызывается
+    on_chunk_committed со списком исходников порции - это точка, с которой
+    можно продолжить прерванный запуск. При push_each_chunk каждая порция
+    сразу отправляется в удаленный репозиторий, а при background_push
+    коммиты передаются в фоновую очередь отправки (см. push_queue.py).
+
+    При ingest_backend = 'fast-import' сжатые данные не касаются диска:
+    они передаются в git fast-import как объекты blob. Если fast-import
+    запустить не удалось, используется обычная запись через индекс.
+
+    Ход обработки передается не строкой лога на файл, а словарем
+    прогресса в progress (см. progress.ProgressTracker), а итоговые
+    счетчики (файлы, ошибки, объем, коммиты) - в metrics (run_metrics.RunMetrics).
+    """
+
+    QUEUE_SIZE = 32
+
+    def __init__(self, settings, git_manager, image_processor, log_signal, on_chunk_committed=None,
+                 progress=None, metrics=None):
+        self.settings = settings
+        self.git_manager = git_manager
+        self.image_processor = image_processor
+        self.log_signal = log_signal
+        self.commit_batch_size = max(1, int(settings.get('commit_batch_size', 100)))
+        self.commit_batch_bytes = max(1, int(settings.get('commit_batch_mb', 256))) * 1024 * 1024
+        self.direct_output = settings.get('direct_output', True)
+        self.push_each_chunk = settings.get('push_each_chunk', True)
+        self.background_push = settings.get('background_push', True)
+        self.fast_import = settings.get('ingest_backend', 'index') == 'fast-import'
+        self.on_chunk_committed = on_chunk_committed
+        self.progress = progress
+        self.metrics = metrics
+
+        self.committed_sources = []
+        self.failed = 0
+        self.error = None
+        # Результат последнего push и наличие неотправленных коммитов
+        self.push_result = True
+        self.unpushed = False
+
+    def run(self, file_paths):
+        """Обрабатывает и фиксирует файлы, возвращает результат push"""
+        if self.fast_import:
+            self.fast_import = self.git_manager.start_fast_import()
+
+        stage_queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        stager = threading.Thread(target=self._stage_loop, args=(stage_queue,))
+        stager.start()
+
+        tracker = ProgressTracker(len(file_paths), self.progress) if self.progress else None
+        try:
+            output_dir = self.git_manager.repo_path if self.direct_output else None
+            results = self.image_processor.process_many(file_paths, output_dir=output_dir,
+                                                        in_memory=self.fast_import)
+            for file_path, processed_path, error in results:
+                bytes_in, bytes_out = self._size(file_path), self._size(processed_path)
+                if tracker:
+                    tracker.advance(bytes_in, bytes_out, failed=not processed_path)
+                if self.metrics:
+                    self.metrics.count('files')
+                    self.metrics.count('failed', int(not processed_path))
+                    self.metrics.count('bytes_in', bytes_in)
+                    self.metrics.count('bytes_out', bytes_out)
+                if not processed_path:
+                    self.failed += 1
+                elif self.error or not self._put(stage_queue, (file_path, processed_path)):
+                    # Поток индексации упал - дальше сжимать бессмысленно
+                    self._discard(processed_path)
+                    break
+        finally:
+            self._put(stage_queue, None)
+            stager.join()
+            if self.fast_import:
+                self.git_manager.finish_fast_import(success=self.error is None)
+
+        if self.failed:
+            self.log_signal.emit(f"Не удалось обработать файлов: {self.failed}")
+        if self.error:
+            raise self.error
+
+        if self.unpushed and self.push_result is True:
+            self.push_result = self.git_manager.push()
+        return self.push_result
+
+    @staticmethod
+    def _size(processed):
+        """Размер исходника, сжатого файла или сжатых данных в памяти"""
+        if not processed:
+            return 0
+        if in_memory_result(processed):
+            return len(processed[1])
+        try:
+            return os.path.getsize(processed)
+        except OSError:
+            return 0
+
+    def _put(self, stage_queue, item):
+        """Кладет элемент в очередь, не зависая, если поток индексации завершился"""
+        while True:
+            try:
+                stage_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self.error:
+                    return False
+
+    def _stage_loop(self, stage_queue):
+        chunk_sources = []
+        staged_count = 0
+        staged_bytes = 0
+        done = False
+
+        try:
+            while not done:
+                # Забираем все, что уже готово, и индексируем одним вызовом
+                batch = [stage_queue.get()]
+                while len(batch) < self.QUEUE_SIZE:
+                    try:
+                        batch.append(stage_queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if None in batch:
+                    done = True
+                    batch = [item for item in batch if item is not None]
+
+                if batch and self.fast_import:
+                    blobs = [processed for _, processed in batch]
+                    staged_bytes += sum(len(data) for _, data in blobs)
+                    added = self.git_manager.stage_blobs(blobs)
+                    staged_count += len(added)
+                    chunk_sources.extend(source for source, _ in batch)
+                elif batch:
+                    processed_paths = [path for _, path in batch]
+                    staged_bytes += sum(os.path.getsize(path) for path in processed_paths)
+                    if self.direct_output:
+                        added = self.git_manager.stage_in_place(processed_paths)
+                    else:
+                        rel_paths = [layout_path(source, self.settings) for source, _ in batch]
+                        added = self.git_manager.stage_files(processed_paths, rel_paths)
+                        for processed_path in processed_paths:
+                            self._remove_temp(processed_path)
+                    staged_count += len(added)
+                    chunk_sources.extend(source for source, _ in batch)
+
+                chunk_full = staged_count >= self.commit_batch_size or staged_bytes >= self.commit_batch_bytes
+                if staged_count and (chunk_full or done):
+                    self.git_manager.commit_staged(staged_count)
+                    self.log_signal.emit(f"Создан коммит: {staged_count} файлов")
+                    if self.metrics:
+                        self.metrics.count('commits')
+                    self.unpushed = True
+                    self._push_chunk()
+
+                if chunk_full or done or not staged_count:
+                    # Порция зафиксирована (или в ней не оказалось изменений)
+                    if chunk_sources:
+                        self.committed_sources.extend(chunk_sources)
+                        if self.on_chunk_committed:
+                            self.on_chunk_committed(chunk_sources)
+                    chunk_sources = []
+                    staged_count = 0
+                    staged_bytes = 0
+
+        except Exception as e:
+            self.error = e
+            # Освобождаем производителя и удаляем оставшиеся временные файлы
+            while not done:
+                item = stage_queue.get()
+                if item is None:
+                    break
+                self._discard(item[1])
+
+    def _push_chunk(self):
+        """Отправляет порцию; после неудачи коммиты копятся локально до конца запуска"""
+        if self.background_push:
+            # Очередь сама решает, когда отправить накопленные коммиты
+            self.git_manager.push_queue.notify()
+            self.unpushed = False
+            return
+        if not self.push_each_chunk or self.push_result is not True:
+            return
+        self.push_result = self.git_manager.push()
+        if self.push_result is True:
+            self.unpushed = False
+
+    def _discard(self, processed):
+        """Удаляет результат, который не попадет в репозиторий (если это временный файл)"""
+        if not self.direct_output and not self.fast_import:
+            self._remove_temp(processed)
+
+    def _remove_temp(self, processed_path):
+        try:
+            if os.path.exists(processed_path):
+                os.remove(processed_path)
+        except Exception as e:
+            self.log_signal.emit(f"Ошибка при удалении временного файла: {str(e)}")
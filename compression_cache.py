@@ -0,0 +1,119 @@
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+
+
+def default_cache_dir():
+    """Каталог кэша рядом с приложением (как и backup_repo)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "compression_cache")
+
+
+def hash_file(file_path, extra=b''):
+    """Быстрый хэш содержимого файла (читается через mmap)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                digest.update(data)
+    digest.update(extra)
+    return digest.hexdigest()
+
+
+class CompressionCache:
+    """Кэш сжатых изображений, адресуемый содержимым исходника.
+
+    Ключ - хэш байтов исходного файла и параметров сжатия, значение -
+    готовый сжатый файл. Общий размер кэша ограничен max_bytes, при
+    превышении удаляются давно не использованные записи (LRU).
+    Кэшем могут одновременно пользоваться несколько процессов пула.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, file TEXT, size INTEGER, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, key):
+        """Возвращает путь к сжатому файлу из кэша или None"""
+        row = self.conn.execute("SELECT file FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        cached_path = os.path.join(self.cache_dir, row[0])
+        if not os.path.exists(cached_path):
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+
+        self.conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return cached_path
+
+    def put(self, key, output_path):
+        """Сохраняет копию сжатого файла в кэш"""
+        size = os.path.getsize(output_path)
+        if size > self.max_bytes:
+            return
+
+        ext = os.path.splitext(output_path)[1]
+        self._store(key, ext, size, lambda tmp_path: shutil.copyfile(output_path, tmp_path))
+
+    def put_bytes(self, key, data, ext):
+        """Сохраняет в кэш сжатые данные из памяти"""
+        if len(data) > self.max_bytes:
+            return
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+        self._store(key, ext, len(data), write)
+
+    def _store(self, key, ext, size, write):
+        rel_path = os.path.join(key[:2], key + ext)
+        cached_path = os.path.join(self.cache_dir, rel_path)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+
+        # Пишем через временный файл, чтобы другой процесс не прочитал его недописанным
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, cached_path)
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (key, file, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, rel_path, size, time.time())
+        )
+        self.conn.commit()
+        self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self.conn.execute("SELECT key, file, size FROM entries ORDER BY last_used").fetchall()
+        for key, rel_path, size in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, rel_path))
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+        self.conn.commit()
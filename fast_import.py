@@ -0,0 +1,116 @@
+import hashlib
+import subprocess
+import time
+
+
+def blob_sha(data):
+    """SHA-1 объекта blob git для данных"""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _quote_path(path):
+    """Путь для команд fast-import (кавычки нужны только для особых символов)"""
+    if path.startswith('"') or '\n' in path:
+        escaped = path.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return f'"{escaped}"'
+    return path
+
+
+class FastImporter:
+    """Запись файлов в репозиторий потоком `git fast-import`.
+
+    Данные передаются как объекты blob прямо в базу объектов, коммиты
+    создаются без индекса и рабочей копии. После каждого коммита
+    выполняется checkpoint: fast-import записывает пакет и обновляет ветку,
+    так что коммит сразу можно отправлять.
+    """
+
+    def __init__(self, repo_dir, ref):
+        self.repo_dir = repo_dir
+        self.ref = ref
+        self.process = None
+        self.mark = 0
+        self.files = []
+        self.parent = None
+
+    def start(self):
+        self.parent = self._git('rev-parse', '--verify', '-q', self.ref + '^{commit}', check=False) or None
+        self.process = subprocess.Popen(
+            ['git', 'fast-import', '--quiet', '--done'],
+            cwd=self.repo_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+
+    def add_blob(self, path, data):
+        """Передает содержимое файла, путь попадет в следующий коммит"""
+        self.mark += 1
+        self._write(b"blob\nmark :%d\ndata %d\n" % (self.mark, len(data)))
+        self._write(data)
+        self._write(b"\n")
+        self.files.append((path, self.mark))
+
+    def commit(self, message):
+        """Создает коммит из переданных с прошлого коммита файлов"""
+        message_bytes = message.encode('utf-8')
+        self.mark += 1
+        lines = [
+            f"commit {self.ref}",
+            f"mark :{self.mark}",
+            f"committer {self._ident()}",
+            f"data {len(message_bytes)}",
+        ]
+        self._write("\n".join(lines).encode('utf-8') + b"\n" + message_bytes + b"\n")
+
+        # Первый коммит потока продолжает существующую ветку, следующие - цепочку потока
+        if self.parent:
+            self._write(f"from {self.parent}\n".encode('utf-8'))
+            self.parent = None
+
+        for path, mark in self.files:
+            self._write(f"M 100644 :{mark} {_quote_path(path)}\n".encode('utf-8'))
+        self._write(b"\n")
+        self.files = []
+
+    def checkpoint(self):
+        """Просит fast-import записать пакет и обновить ветку"""
+        self._write(b"checkpoint\n\nprogress checkpoint\n\n")
+        self.process.stdin.flush()
+        # Команды выполняются по порядку: строка progress придет после checkpoint
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("git fast-import неожиданно завершился")
+            if line.strip() == b"progress checkpoint":
+                return
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self._write(b"done\n")
+            self.process.stdin.close()
+        finally:
+            returncode = self.process.wait()
+            self.process = None
+        if returncode != 0:
+            raise RuntimeError(f"git fast-import завершился с кодом {returncode}")
+
+    def abort(self):
+        """Прерывает поток без сохранения незавершенного коммита"""
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def _write(self, data):
+        self.process.stdin.write(data)
+
+    def _ident(self):
+        ident = self._git('var', 'GIT_COMMITTER_IDENT', check=False)
+        if ident:
+            return ident
+        return f"Image Backup Tool <image-backup@localhost> {int(time.time())} +0000"
+
+    def _git(self, *args, check=True):
+        result = subprocess.run(['git'] + list(args), cwd=self.repo_dir,
+                                capture_output=True, text=True, check=check)
+        return result.stdout.strip()
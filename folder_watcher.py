@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from scan_index import is_source_image
+
+
+class _ImageEventHandler(FileSystemEventHandler):
+    """Передает наблюдателю пути созданных, измененных и перемещенных изображений"""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.touch(event.dest_path)
+
+
+class FolderWatcher:
+    """Следит за папкой и отдает готовые к фиксации файлы пачками.
+
+    Файл считается дописанным, когда его размер не меняется в течение
+    watch_stable_seconds. Готовые файлы копятся в пачку, которая
+    передается в on_batch при достижении watch_batch_size файлов или
+    через watch_batch_window секунд после первого файла в пачке.
+    on_batch вызывается из фонового потока.
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, settings, on_batch, log_signal):
+        self.settings = settings
+        self.on_batch = on_batch
+        self.log_signal = log_signal
+        self.stable_seconds = float(settings.get('watch_stable_seconds', 2))
+        self.batch_size = int(settings.get('watch_batch_size', 50))
+        self.batch_window = float(settings.get('watch_batch_window', 30))
+
+        self.lock = threading.Lock()
+        # path -> (размер при последней проверке, время последнего события)
+        self.pending = {}
+        self.batch = []
+        self.batch_started = None
+
+        self.observer = None
+        self.poll_thread = None
+        self.stop_event = threading.Event()
+
+    def start(self):
+        watch_folder = self.settings['watch_folder']
+        if not os.path.isdir(watch_folder):
+            self.log_signal.emit(f"Ошибка: Папка {watch_folder} не существует")
+            return False
+
+        self.stop_event.clear()
+        self.observer = Observer()
+        self.observer.schedule(_ImageEventHandler(self), watch_folder, recursive=True)
+        self.observer.start()
+
+        self.poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self.poll_thread.start()
+
+        self.log_signal.emit(f"Слежение за папкой {watch_folder} запущено")
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.poll_thread:
+            self.poll_thread.join()
+            self.poll_thread = None
+
+        # Отдаем то, что уже успело накопиться
+        self._flush()
+        self.log_signal.emit("Слежение за папкой остановлено")
+
+    def touch(self, path):
+        """Регистрирует событие файловой системы для файла"""
+        if not is_source_image(os.path.basename(path)):
+            return
+        with self.lock:
+            self.pending[path] = (None, time.monotonic())
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.POLL_INTERVAL):
+            try:
+                self._collect_stable()
+                self._maybe_flush()
+            except Exception as e:
+                self.log_signal.emit(f"Ошибка слежения за папкой: {str(e)}")
+
+    def _collect_stable(self):
+        now = time.monotonic()
+        with self.lock:
+            for path, (last_size, last_event) in list(self.pending.items()):
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    # Файл удален или переименован до завершения записи
+                    del self.pending[path]
+                    continue
+
+                if size != last_size:
+                    self.pending[path] = (size, now)
+                elif now - last_event >= self.stable_seconds:
+                    del self.pending[path]
+                    if path not in self.batch:
+                        self.batch.append(path)
+                    if self.batch_started is None:
+                        self.batch_started = now
+
+    def _maybe_flush(self):
+        with self.lock:
+            if not self.batch:
+                return
+            full = len(self.batch) >= self.batch_size
+            expired = time.monotonic() - self.batch_started >= self.batch_window
+        if full or expired:
+            self._flush()
+
+    def _flush(self):
+        with self.lock:
+            batch = self.batch
+            self.batch = []
+            self.batch_started = None
+        if batch:
+            self.log_signal.emit(f"Обнаружено новых изображений: {len(batch)}")
+            self.on_batch(batch)
@@ -1,17 +1,81 @@
 import os
 import shutil
-from git import Repo, GitCommandError
+import filecmp
+import json
+import tempfile
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from git import Repo, GitCommandError, InvalidGitRepositoryError, PushInfo
 import base64
 
+from blob_restore import (filter_paths, prefetch_blobs, skip_existing, split_patterns,
+                          stream_blobs, tree_entries)
+from fast_import import FastImporter, blob_sha
+from fs_utils import fast_copy
+from push_queue import PushQueue
+from repo_layout import layout_path, output_name
+from repo_maintenance import RepoMaintenance
+
 
 class GitManager:
+    # Долгоживущие сессии по URL репозитория (см. session)
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    @classmethod
+    def session(cls, settings, log_signal):
+        """Возвращает общий для всех операций GitManager для репозитория.
+
+        Открытый репозиторий и учетные данные переиспользуются между
+        фиксациями, поэтому повторная операция не открывает репозиторий
+        заново. Операции одной сессии выполняются по очереди (session.lock).
+        """
+        with cls._sessions_lock:
+            manager = cls._sessions.get(settings['repo_url'])
+            if manager is None:
+                manager = cls(settings, log_signal)
+                cls._sessions[settings['repo_url']] = manager
+            manager.settings = settings
+            manager.log_signal = log_signal
+            return manager
+
     def __init__(self, settings, log_signal):
         self.settings = settings
         self.log_signal = log_signal
+        # repo_path в настройках задает другой каталог рабочей копии
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        self.repo_path = os.path.join(current_dir, "backup_repo")
+        self.repo_path = settings.get('repo_path') or os.path.join(current_dir, "backup_repo")
         self.repo = None
         self.credentials = None
+        self.importer = None
+        self.tree_shas = {}
+        self.imported_paths = []
+        # Файлы, записанные в рабочую копию после последнего коммита
+        self.worktree_paths = []
+        self.lock = threading.RLock()
+        # push и обслуживание репозитория не выполняются одновременно
+        self.push_lock = threading.Lock()
+        self.maintenance = RepoMaintenance(self.repo_path, self.push_lock, self._log_background)
+        self.push_queue = PushQueue(self)
+        # RunMetrics текущего запуска (None - замеры не ведутся)
+        self.metrics = None
+
+    def measure(self, stage):
+        """Контекст замера времени этапа в метриках запуска"""
+        return self.metrics.stage(stage) if self.metrics else nullcontext()
+
+    def _log_background(self, message):
+        """Пишет в лог из фонового потока: объект лога мог быть уже удален"""
+        try:
+            self.log_signal.emit(message)
+        except RuntimeError:
+            pass
+
+    def schedule_maintenance(self):
+        """Проверяет состояние репозитория и при необходимости обслуживает его в фоне"""
+        if self.repo is not None and self.settings.get('maintenance_enabled', True):
+            self.maintenance.schedule(self.settings)
 
     def set_credentials(self, credentials):
         """Устанавливает учетные данные для аутентификации"""
@@ -47,7 +111,11 @@ class GitManager:
                 f'https://{self.credentials["username"]}:{self.credentials["password"]}@'
             )
 
-    def init_repo(self):
+    def init_repo(self, sparse_checkout=None):
+        """Клонирует или открывает рабочий репозиторий.
+
+        sparse_checkout переопределяет одноименную настройку при клонировании.
+        """
         try:
             # Загружаем сохраненные учетные данные
             self.load_credentials_from_settings()
@@ -64,19 +132,15 @@ class GitManager:
             if not os.path.exists(self.repo_path):
                 os.makedirs(self.repo_path, exist_ok=True)
                 self.log_signal.emit(f"Клонирование репозитория в {self.repo_path}")
-                self.repo = Repo.clone_from(auth_url, self.repo_path)
+                self.repo = self.clone(auth_url, sparse_checkout)
             else:
-                self.log_signal.emit("Открытие существующего репозитория")
-                self.repo = Repo(self.repo_path)
-                # Pull последних изменений
-                origin = self.repo.remote('origin')
-
-                # Для операций pull/push также используем аутентификацию
-                with self.repo.git.custom_environment(GIT_ASKPASS='echo',
-                                                      GIT_USERNAME=self.credentials.get('username', ''),
-                                                      GIT_PASSWORD=self.credentials.get('password', '')):
-                    origin.pull()
+                if self.repo is None:
+                    self.log_signal.emit("Открытие существующего репозитория")
+                    self.repo = Repo(self.repo_path)
+                self.sync_with_remote()
 
+            if self.settings.get('background_push', True):
+                self.push_queue.resume()
             return True
         except GitCommandError as e:
             self.log_signal.emit(f"Ошибка Git: {str(e)}")
@@ -88,6 +152,154 @@ class GitManager:
 
             return False
 
+    def auth_environment(self):
+        """Окружение git с учетными данными для сетевых операций"""
+        if not self.credentials:
+            return nullcontext()
+        return self.repo.git.custom_environment(GIT_ASKPASS='echo',
+                                                GIT_USERNAME=self.credentials.get('username', ''),
+                                                GIT_PASSWORD=self.credentials.get('password', ''))
+
+    def sync_with_remote(self):
+        """Подтягивает изменения, только если ветка на сервере сдвинулась.
+
+        Состояние сервера проверяется одним ls-remote и сравнивается с
+        локальной ссылкой origin/<ветка>; fetch и rebase выполняются лишь
+        при расхождении.
+        """
+        branch = self.branch_name()
+        remote_ref = f"refs/remotes/origin/{branch}"
+
+        try:
+            with self.auth_environment():
+                output = self.repo.git.ls_remote('origin', f"refs/heads/{branch}")
+        except GitCommandError as e:
+            if 'authentication' in str(e).lower() or '401' in str(e):
+                raise
+            # Без сети коммиты создаются локально и отправятся позже
+            self.log_signal.emit(f"Сервер недоступен, работа продолжается локально: {str(e)}")
+            return
+        remote_sha = output.split()[0] if output else None
+
+        try:
+            known_sha = self.repo.git.rev_parse('--verify', '-q', remote_ref)
+        except GitCommandError:
+            known_sha = None
+
+        if remote_sha == known_sha:
+            self.log_signal.emit("Удаленный репозиторий не изменился")
+            # Ветка, разошедшаяся с сервером в прошлый раз, переносится снова
+            if known_sha and self.repo.head.is_valid() and not self.contains(remote_ref):
+                self.rebase_onto_remote(branch)
+            return
+
+        self.log_signal.emit("Получение изменений из удаленного репозитория")
+        # Явный refspec: у неглубокого клона пустого репозитория нет
+        # remote.origin.fetch, и origin/<ветка> иначе не появляется
+        with self.auth_environment():
+            self.repo.git.fetch('origin', f"+refs/heads/{branch}:{remote_ref}")
+
+        if not self.repo.head.is_valid():
+            self.repo.git.checkout('-B', branch, f"origin/{branch}")
+        elif self.repo.git.rev_list('--count', f"origin/{branch}..HEAD") == '0':
+            self.repo.git.merge('--ff-only', f"origin/{branch}")
+        else:
+            # Есть локальные неотправленные коммиты - переносим их поверх сервера
+            self.rebase_onto_remote(branch)
+
+    def rebase_onto_remote(self, branch):
+        """Переносит локальные коммиты поверх origin/<ветка>.
+
+        При конфликте rebase отменяется и пробуется слияние; если
+        конфликтует и оно, ветка остается как была, а ошибка Git
+        пробрасывается с понятным сообщением.
+        """
+        try:
+            self.repo.git.rebase(f"origin/{branch}")
+            return
+        except GitCommandError as e:
+            self.abort_rebase()
+            self.log_signal.emit(f"Не удалось перенести локальные коммиты поверх сервера: {str(e)}")
+
+        try:
+            self.repo.git.merge('--no-edit', f"origin/{branch}")
+            self.log_signal.emit("Локальные коммиты объединены с сервером слиянием")
+        except GitCommandError as e:
+            try:
+                self.repo.git.merge('--abort')
+            except GitCommandError:
+                pass
+            raise GitCommandError(e.command, e.status,
+                                  "локальные коммиты конфликтуют с сервером, ветка оставлена "
+                                  "без изменений; разрешите конфликт в " + self.repo_path) from e
+
+    def contains(self, ref):
+        """Проверяет, что коммит ref уже входит в историю HEAD"""
+        try:
+            self.repo.git.merge_base('--is-ancestor', ref, 'HEAD')
+            return True
+        except GitCommandError:
+            return False
+
+    def abort_rebase(self):
+        """Отменяет незавершенный rebase, возвращая ветку в исходное состояние"""
+        git_dir = self.repo.git_dir
+        if (os.path.isdir(os.path.join(git_dir, 'rebase-merge'))
+                or os.path.isdir(os.path.join(git_dir, 'rebase-apply'))):
+            self.repo.git.rebase('--abort')
+            self.log_signal.emit("Незавершенный rebase отменен")
+
+    def branch_name(self):
+        """Имя текущей ветки.
+
+        Оставшийся от прошлого запуска rebase сначала отменяется; если HEAD
+        все равно не указывает на ветку, выбрасывается GitCommandError.
+        """
+        if self.repo.head.is_detached:
+            self.abort_rebase()
+        if self.repo.head.is_detached:
+            raise GitCommandError(['git', 'symbolic-ref', 'HEAD'], 128,
+                                  f"HEAD не указывает на ветку в {self.repo_path}")
+        return self.repo.active_branch.name
+
+    # Шаблоны частичной рабочей копии: все, кроме сжатых изображений
+    SPARSE_PATTERNS = ("/*", "!*_compressed.*")
+
+    def clone(self, auth_url, sparse_checkout=None):
+        """Клонирует рабочий репозиторий с учетом настроек клонирования.
+
+        clone_depth > 0 - неглубокий клон (только последние коммиты),
+        partial_clone - клон без содержимого файлов (blob:none), оно
+        докачивается по требованию, sparse_checkout - рабочая копия без
+        сжатых изображений. Для добавления новых файлов и push все это
+        не мешает, а объем первого клонирования перестает расти с историей.
+        """
+        clone_args = {}
+        depth = int(self.settings.get('clone_depth', 0))
+        if depth > 0:
+            clone_args['depth'] = depth
+        if self.settings.get('partial_clone', False):
+            clone_args['filter'] = 'blob:none'
+
+        sparse = sparse_checkout
+        if sparse is None:
+            sparse = self.settings.get('sparse_checkout', False)
+        if sparse:
+            clone_args['no_checkout'] = True
+
+        repo = Repo.clone_from(auth_url, self.repo_path, **clone_args)
+
+        if sparse:
+            repo.git.config('core.sparseCheckout', 'true')
+            sparse_file = os.path.join(repo.git_dir, 'info', 'sparse-checkout')
+            os.makedirs(os.path.dirname(sparse_file), exist_ok=True)
+            with open(sparse_file, 'w') as f:
+                f.write('\n'.join(self.SPARSE_PATTERNS) + '\n')
+            # В пустом репозитории выписывать нечего
+            if repo.head.is_valid():
+                repo.git.checkout(repo.head.ref.name)
+        return repo
+
     def load_credentials_from_settings(self):
         """Загружает сохраненные учетные данные"""
         from PyQt5.QtCore import QSettings
@@ -120,67 +332,337 @@ class GitManager:
                 self.log_signal.emit(f"Ошибка загрузки учетных данных: {str(e)}")
                 self.credentials = None
 
-    def add_multiple_to_repo(self, file_paths):
-        """Добавляет несколько файлов одним коммитом"""
-        try:
-            added_files = []
+    def stage_files(self, file_paths, rel_paths=None):
+        """Копирует файлы в рабочую копию и добавляет их в индекс.
+
+        rel_paths - пути в репозитории (см. repo_layout), по умолчанию
+        файлы кладутся в корень под своими именами.
+        Возвращает пути файлов, которые действительно были добавлены.
+        """
+        if rel_paths is None:
+            rel_paths = [os.path.basename(file_path) for file_path in file_paths]
+        added_files = []
 
-            for file_path in file_paths:
+        with self.measure('copy'):
+            for file_path, rel_path in zip(file_paths, rel_paths):
                 # Копируем файл в репозиторий
-                repo_file_path = os.path.join(self.repo_path, os.path.basename(file_path))
+                repo_file_path = os.path.join(self.repo_path, *rel_path.split('/'))
+
+                # Точно такой же файл уже лежит в репозитории - копировать нечего
+                if os.path.exists(repo_file_path) and filecmp.cmp(file_path, repo_file_path, shallow=False):
+                    continue
+
+                os.makedirs(os.path.dirname(repo_file_path), exist_ok=True)
                 shutil.copy2(file_path, repo_file_path)
-                added_files.append(os.path.basename(file_path))
+                added_files.append(rel_path)
+
+        if added_files:
+            with self.measure('index_add'):
+                self.repo.index.add(added_files)
+            self.worktree_paths.extend(added_files)
+        return added_files
+
+    def stage_in_place(self, file_paths):
+        """Добавляет в индекс файлы, уже записанные в рабочую копию.
+
+        Возвращает пути (относительно репозитория), содержимое которых
+        действительно изменилось.
+        """
+        rel_paths = [os.path.relpath(file_path, self.repo_path) for file_path in file_paths]
+        # repo.index читает и разбирает файл индекса при каждом обращении
+        index = self.repo.index
+        old_shas = {}
+        for rel_path in rel_paths:
+            entry = index.entries.get((rel_path, 0))
+            old_shas[rel_path] = entry.binsha if entry else None
+
+        with self.measure('index_add'):
+            entries = index.add(rel_paths)
+        self.worktree_paths.extend(rel_paths)
+        return [entry.path for entry in entries if old_shas.get(entry.path) != entry.binsha]
+
+    def commit_staged(self, count):
+        """Создает локальный коммит из проиндексированных файлов"""
+        with self.measure('commit'):
+            if self.importer:
+                self.importer.commit(f"Add {count} images")
+                self.importer.checkpoint()
+                return
+            self.repo.index.commit(f"Add {count} images")
+        self.prune_worktree()
+
+    def prune_worktree(self):
+        """Убирает зафиксированные файлы из частичной рабочей копии.
+
+        Шаблоны sparse-checkout действуют только при выписывании файлов,
+        а сжатые изображения пишутся в рабочую копию напрямую. Без этого
+        при sparse_checkout место на диске росло бы вместе с историей.
+        """
+        paths, self.worktree_paths = self.worktree_paths, []
+        if not paths or not self.repo.config_reader().get_value('core', 'sparseCheckout', False):
+            return
+        paths = [path.replace(os.sep, '/') for path in paths]
+        for path in paths:
+            file_path = os.path.join(self.repo_path, *path.split('/'))
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        # Как и после fast-import: отсутствующие файлы не считаются удаленными
+        for i in range(0, len(paths), 1000):
+            self.repo.git.update_index('--skip-worktree', '--', *paths[i:i + 1000])
+
+    def start_fast_import(self):
+        """Переключает запись на поток git fast-import (без индекса и рабочей копии)"""
+        try:
+            self.tree_shas = {}
+            if self.repo.head.is_valid():
+                for line in self.repo.git.ls_tree('-r', '--full-tree', 'HEAD').splitlines():
+                    info, path = line.split('\t', 1)
+                    self.tree_shas[path] = info.split()[2]
+
+            self.importer = FastImporter(self.repo_path, self.repo.head.ref.path)
+            self.importer.start()
+            return True
+        except (OSError, GitCommandError, TypeError) as e:
+            self.log_signal.emit(f"git fast-import недоступен, используется обычная запись: {str(e)}")
+            self.importer = None
+            return False
 
-            # Добавляем все файлы одним коммитом
-            self.repo.index.add(added_files)
-            self.repo.index.commit(f"Add {len(added_files)} images")
+    def stage_blobs(self, blobs):
+        """Передает в fast-import пары (путь, байты), возвращает измененные пути"""
+        added = []
+        with self.measure('fast_import'):
+            for path, data in blobs:
+                sha = blob_sha(data)
+                if self.tree_shas.get(path) == sha:
+                    continue
+                self.importer.add_blob(path, data)
+                self.tree_shas[path] = sha
+                self.imported_paths.append(path)
+                added.append(path)
+        return added
+
+    def finish_fast_import(self, success=True):
+        """Завершает поток fast-import и приводит индекс к новому HEAD"""
+        if not self.importer:
+            return
+        importer, self.importer = self.importer, None
+        imported_paths, self.imported_paths = self.imported_paths, []
+        if not success:
+            importer.abort()
+            return
+        importer.close()
+        # Рабочая копия не трогается: записанных файлов в ней нет, а индекс
+        # должен совпадать с HEAD, чтобы следующие коммиты их не удалили.
+        # skip-worktree не дает отсутствующим файлам считаться удаленными
+        self.repo.git.reset('-q')
+        for i in range(0, len(imported_paths), 1000):
+            self.repo.git.update_index('--skip-worktree', '--', *imported_paths[i:i + 1000])
+
+    def migrate_layout(self, sources):
+        """Переносит файлы, лежащие в корне (раскладка flat), в текущую раскладку.
+
+        sources - пары (путь исходника, mtime_ns) из индекса сканирования:
+        по ним восстанавливается, какому исходнику соответствует файл в
+        корне. Содержимое не перечитывается - в индексе меняются только
+        пути. Файлы с неизвестным исходником остаются на месте, как и
+        общие для нескольких исходников, если какого-то из них уже нет.
+        Возвращает результат push и список исходников, которые нужно
+        зафиксировать заново.
+        """
+        entries = {}
+        for record in self.repo.git.ls_files('-s', '-z').split('\0'):
+            if record:
+                info, path = record.split('\t', 1)
+                mode, sha, _ = info.split()
+                entries[path] = (mode, sha)
+
+        targets = {}
+        for source, mtime_ns in sources:
+            old_path = output_name(source, self.settings)
+            if old_path in entries:
+                targets.setdefault(old_path, []).append(
+                    (source, layout_path(source, self.settings, mtime_ns)))
+
+        # Файл в корне, общий для нескольких исходников, хранит лишь один из них:
+        # он удаляется, а исходники будут зафиксированы заново по новым путям.
+        # Если какого-то исходника уже нет, заново зафиксировать его нельзя,
+        # и файл остается в корне
+        moves = []
+        recommit = []
+        kept = 0
+        for old_path, candidates in targets.items():
+            new_paths = {new_path for _, new_path in candidates}
+            if len(new_paths) > 1:
+                existing = [source for source, _ in candidates if os.path.exists(source)]
+                if len(existing) < len(candidates):
+                    kept += 1
+                else:
+                    moves.append((old_path, None))
+                recommit.extend(existing)
+            elif old_path not in new_paths:
+                moves.append((old_path, new_paths.pop()))
+
+        unknown = sum(1 for path in entries if '/' not in path and '_compressed.' in path
+                      and path not in targets)
+        if unknown:
+            self.log_signal.emit(f"Остаются в корне (исходник неизвестен): {unknown}")
+        if kept:
+            self.log_signal.emit(f"Остаются в корне (часть исходников удалена): {kept}")
+        if not moves:
+            self.log_signal.emit("Переносить нечего")
+            return True, recommit
+
+        index_info = []
+        skip_worktree = []
+        for old_path, new_path in moves:
+            index_info.append(f"0 {'0' * 40}\t{old_path}")
+            old_file = os.path.join(self.repo_path, old_path)
+            if new_path is None or new_path in entries:
+                # Файл уже сохранен в новой раскладке (или будет сохранен заново)
+                if os.path.exists(old_file):
+                    os.remove(old_file)
+                continue
+
+            mode, sha = entries[old_path]
+            index_info.append(f"{mode} {sha}\t{new_path}")
+            if os.path.exists(old_file):
+                os.renames(old_file, os.path.join(self.repo_path, *new_path.split('/')))
+            else:
+                # Файла нет в рабочей копии (sparse-checkout или fast-import)
+                skip_worktree.append(new_path)
+
+        with tempfile.TemporaryFile() as index_input:
+            index_input.write(''.join(line + '\0' for line in index_info).encode())
+            index_input.seek(0)
+            self.repo.git.update_index('-z', '--index-info', istream=index_input)
+        for i in range(0, len(skip_worktree), 1000):
+            self.repo.git.update_index('--skip-worktree', '--', *skip_worktree[i:i + 1000])
+
+        layout = self.settings.get('repo_layout', 'flat')
+        moved = sum(1 for _, new_path in moves if new_path)
+        self.repo.index.commit(f"Move {moved} images to {layout} layout")
+        self.log_signal.emit(f"Перенесено файлов в раскладку {layout}: {moved}")
+        if recommit:
+            self.log_signal.emit(f"Будут зафиксированы заново при следующем сканировании: {len(recommit)}")
+        return self.push(), recommit
+
+    def resume_pushes(self):
+        """Подхватывает коммиты, не отправленные до перезапуска (без обращения к сети)"""
+        if not self.settings.get('background_push', True) or not os.path.isdir(self.repo_path):
+            return
+        with self.lock:
+            try:
+                if self.repo is None:
+                    self.load_credentials_from_settings()
+                    self.repo = Repo(self.repo_path)
+                self.push_queue.resume()
+            except (GitCommandError, InvalidGitRepositoryError) as e:
+                self.log_signal.emit(f"Не удалось проверить неотправленные коммиты: {str(e)}")
+
+    def request_push(self):
+        """Отправляет новые коммиты: в фоне через очередь или сразу"""
+        if self.settings.get('background_push', True):
+            self.push_queue.notify()
+            return True
+        return self.push()
+
+    def unpushed_count(self):
+        """Число локальных коммитов, которых нет на сервере"""
+        if not self.repo.head.is_valid():
+            return 0
+        branch = self.branch_name()
+        try:
+            return int(self.repo.git.rev_list('--count', f"origin/{branch}..HEAD"))
+        except GitCommandError:
+            # Ветки на сервере еще нет - не отправлено все
+            return int(self.repo.git.rev_list('--count', 'HEAD'))
 
+    def push(self):
+        """Отправляет локальные коммиты в удаленный репозиторий"""
+        try:
             # Пушим изменения с аутентификацией
             origin = self.repo.remote('origin')
 
-            if self.credentials:
-                with self.repo.git.custom_environment(GIT_ASKPASS='echo',
-                                                      GIT_USERNAME=self.credentials.get('username', ''),
-                                                      GIT_PASSWORD=self.credentials.get('password', '')):
-                    origin.push()
-            else:
-                origin.push()
+            with self.push_lock, self.auth_environment(), self.measure('push'):
+                results = origin.push()
 
-            self.log_signal.emit(f"Добавлено файлов в репозиторий: {len(added_files)}")
+            # Отклоненный сервером push не выбрасывает исключение сам
+            failed_flags = PushInfo.ERROR | PushInfo.REJECTED | PushInfo.REMOTE_REJECTED | PushInfo.REMOTE_FAILURE
+            rejected = [info for info in results if info.flags & failed_flags]
+            if rejected:
+                raise GitCommandError(['git', 'push'], 1, rejected[0].summary)
+            return True
 
         except GitCommandError as e:
-            self.log_signal.emit(f"Ошибка Git при добавлении файлов: {str(e)}")
+            self.log_signal.emit(f"Ошибка Git при отправке: {str(e)}")
 
             # Если ошибка аутентификации
             if 'authentication' in str(e).lower() or '403' in str(e) or '401' in str(e):
                 self.log_signal.emit("Ошибка аутентификации при push")
                 return 'auth_required'
+            return False
 
-    def restore_repo(self):
-        try:
-            restore_path = os.path.join(os.path.expanduser("~"), "restored_images")
-
-            if not os.path.exists(restore_path):
-                os.makedirs(restore_path)
-
-            # Клонируем репозиторий
-            if os.path.exists(self.repo_path):
-                shutil.rmtree(self.repo_path)
-
-            self.log_signal.emit("Клонирование репозитория для восстановления...")
-            repo = Repo.clone_from(self.settings['repo_url'], self.repo_path)
+    # Файл в папке восстановления с последним восстановленным коммитом
+    RESTORE_STATE_FILE = ".restore_state.json"
 
-            # Копируем файлы
-            for item in os.listdir(self.repo_path):
-                if item != '.git':
-                    src_path = os.path.join(self.repo_path, item)
-                    dst_path = os.path.join(restore_path, item)
+    @staticmethod
+    def restore_path():
+        return os.path.join(os.path.expanduser("~"), "restored_images")
 
-                    if os.path.isdir(src_path):
-                        shutil.copytree(src_path, dst_path, dirs_exist_ok=True)
-                    else:
-                        shutil.copy2(src_path, dst_path)
+    def restore_repo(self):
+        """Восстанавливает изображения из репозитория в ~/restored_images.
+
+        Используется существующий клон: fetch выполняется, только если
+        сервер изменился. Последний восстановленный коммит запоминается в
+        папке восстановления, и повторное восстановление копирует лишь
+        пути, измененные после него. Способ копирования задает
+        restore_link_mode (см. fs_utils.fast_copy).
+
+        При restore_mode = 'stream' файлы читаются из объектов git
+        (git cat-file --batch) и пишутся сразу в папку восстановления;
+        новый клон в этом режиме создается без сжатых изображений в
+        рабочей копии. Фильтры restore_paths (glob-шаблоны или каталоги
+        через ';'), restore_since и restore_until ограничивают набор
+        файлов; с фильтрами восстанавливается все подходящее, а
+        последний коммит не запоминается.
+        """
+        try:
+            restore_path = self.restore_path()
+            os.makedirs(restore_path, exist_ok=True)
+
+            stream = self.settings.get('restore_mode', 'worktree') == 'stream'
+            result = self.init_repo(sparse_checkout=True if stream else None)
+            if result is not True:
+                return result
+
+            if not self.repo.head.is_valid():
+                self.log_signal.emit("Репозиторий пуст, восстанавливать нечего")
+                return True
+
+            head = self.repo.head.commit
+            patterns = split_patterns(self.settings.get('restore_paths', ''))
+            since_date = self.settings.get('restore_since') or None
+            until_date = self.settings.get('restore_until') or None
+            filtered = bool(patterns or since_date or until_date)
+
+            state = {} if filtered else self.load_restore_state(restore_path)
+            since = state.get('commit') if state.get('repo_url') == self.settings['repo_url'] else None
+            rel_paths = self.changed_paths(since, head.hexsha)
+            if filtered:
+                rel_paths = filter_paths(self.repo, head.hexsha, rel_paths, patterns, since_date, until_date)
+                self.log_signal.emit(f"Подходит под фильтры файлов: {len(rel_paths)}")
+            elif not rel_paths:
+                self.log_signal.emit("Изменений с прошлого восстановления нет")
+            elif since:
+                self.log_signal.emit(f"Изменено с прошлого восстановления файлов: {len(rel_paths)}")
+
+            if stream:
+                self.stream_restore(head.hexsha, rel_paths, restore_path)
+            else:
+                self.copy_restore(head, rel_paths, restore_path)
 
+            if not filtered:
+                self.save_restore_state(restore_path, head.hexsha)
             self.log_signal.emit(f"Изображения восстановлены в: {restore_path}")
             return True
 
@@ -188,45 +670,70 @@ class GitManager:
             self.log_signal.emit(f"Ошибка восстановления: {str(e)}")
             return False
 
-    def process(self, image_path):
+    def copy_restore(self, head, rel_paths, restore_path):
+        """Копирует файлы из рабочей копии в папку восстановления"""
+        link_mode = self.settings.get('restore_link_mode', 'auto')
+        methods = Counter()
+        for rel_path in rel_paths:
+            dst_path = os.path.join(restore_path, rel_path)
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            src_path = os.path.join(self.repo_path, rel_path)
+            if os.path.isfile(src_path):
+                methods[fast_copy(src_path, dst_path, link_mode)] += 1
+            else:
+                # Файла нет в рабочей копии (sparse-checkout или fast-import) - берем blob
+                with open(dst_path, 'wb') as f:
+                    head.tree[rel_path].stream_data(f)
+                methods['blob'] += 1
+
+        if methods:
+            summary = ", ".join(f"{method}: {count}" for method, count in methods.items())
+            self.log_signal.emit(f"Скопировано файлов: {sum(methods.values())} ({summary})")
+
+    def stream_restore(self, commit, rel_paths, restore_path):
+        """Пишет файлы в папку восстановления прямо из объектов git"""
+        workers = max(1, int(self.settings.get('workers', os.cpu_count() or 1)))
+        shas = tree_entries(self.repo, commit)
+        entries = skip_existing([(path, shas[path]) for path in rel_paths], restore_path, workers)
+        if len(entries) < len(rel_paths):
+            self.log_signal.emit(f"Уже восстановлено ранее: {len(rel_paths) - len(entries)}")
+        if not entries:
+            return
+
+        with self.auth_environment():
+            fetched = prefetch_blobs(self.repo, commit, {sha for _, sha in entries})
+        if fetched:
+            self.log_signal.emit(f"Загружено объектов с сервера: {fetched}")
+
+        written = stream_blobs(self.repo_path, entries, restore_path, workers)
+        self.log_signal.emit(f"Записано файлов из объектов git: {written}")
+
+    def changed_paths(self, since, head):
+        """Пути, добавленные или измененные после коммита since (все пути, если его нет)"""
+        if since == head:
+            return []
+        if since:
+            try:
+                self.repo.git.cat_file('-e', f"{since}^{{commit}}")
+                output = self.repo.git.diff('--name-only', '-z', '--no-renames',
+                                            '--diff-filter=d', since, head)
+                return [path for path in output.split('\0') if path]
+            except GitCommandError:
+                # Коммита нет в клоне (неглубокий клон или переписанная история)
+                self.log_signal.emit("Прошлое восстановление не найдено в истории, копируются все файлы")
+        output = self.repo.git.ls_tree('-r', '-z', '--name-only', '--full-tree', head)
+        return [path for path in output.split('\0') if path]
+
+    def load_restore_state(self, restore_path):
         try:
-            with Image.open(image_path) as img:
-                # Конвертируем в RGB если нужно (для JPEG)
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-
-                # Изменяем размер если нужно
-                if self.settings['resize_enabled']:
-                    img.thumbnail((self.settings['max_size'], self.settings['max_size']), Image.Resampling.LANCZOS)
-
-                # Определяем формат сохранения
-                format_map = {
-                    'webp': 'WEBP',
-                    'jpeg': 'JPEG',
-                    'avif': 'AVIF'
-                }
-                save_format = format_map.get(self.settings['compression_format'], 'WEBP')
-
-                # Создаем имя файла (сохраняем оригинальное имя)
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                output_filename = f"{base_name}_compressed.{self.settings['compression_format']}"
-                output_path = os.path.join(self.processed_dir, output_filename)
-
-                # Сохраняем с нужным качеством
-                save_params = {
-                    'quality': self.settings['compression_quality'],
-                    'optimize': True
-                }
-
-                # Особые параметры для WebP
-                if save_format == 'WEBP':
-                    save_params['method'] = 6  # Максимальное сжатие
-
-                img.save(output_path, save_format, **save_params)
-
-                self.log_signal.emit(f"Изображение обработано: {output_path}")
-                return output_path
-
-        except Exception as e:
-            self.log_signal.emit(f"Ошибка обработки изображения {image_path}: {str(e)}")
-            return None
\ No newline at end of file
+            with open(os.path.join(restore_path, self.RESTORE_STATE_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_restore_state(self, restore_path, commit):
+        state_path = os.path.join(restore_path, self.RESTORE_STATE_FILE)
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'repo_url': self.settings['repo_url'], 'commit': commit}, f)
+        os.replace(tmp_path, state_path)
@@ -1,53 +1,431 @@
+import io
+import multiprocessing
 import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image
 
+from compression_cache import CompressionCache, default_cache_dir, hash_file
+from memory_budget import (budget_bytes, check_decodable, decode_target, estimate_bytes,
+                           image_reduce_factor, open_image, reduce_factor)
+from repo_layout import layout_path, output_name
+from tiled_tiff import band_pixels, load_reduced
+
+
+FORMAT_MAP = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+    'avif': 'AVIF'
+}
+
+# Параметры, от которых зависит результат сжатия (входят в ключ кэша)
+OUTPUT_SETTINGS = ('compression_format', 'compression_quality', 'resize_enabled', 'max_size',
+                   'fast_resize', 'effort')
+
+# Параметры кодировщиков для каждого уровня усилия
+EFFORT_PRESETS = {
+    'fast': {
+        'WEBP': {'method': 2},
+        'JPEG': {'optimize': False},
+        'AVIF': {'speed': 8},
+    },
+    'balanced': {
+        'WEBP': {'method': 4},
+        'JPEG': {'optimize': True},
+        'AVIF': {'speed': 6},
+    },
+    'max': {
+        'WEBP': {'method': 6},  # Максимальное сжатие
+        'JPEG': {'optimize': True, 'progressive': True},
+        'AVIF': {'speed': 2},
+    },
+}
+
+# Порядок понижения усилия в режиме auto
+EFFORT_LEVELS = ('max', 'balanced', 'fast')
+
+# Запас по размеру для быстрого уменьшения: JPEG декодируется (draft) и
+# грубо уменьшается (reduce) не меньше чем до 1.5x целевого размера,
+# финальный шаг делает LANCZOS. Качество сверяется benchmarks/bench_resize.py
+FAST_REDUCING_GAP = 1.5
+
+# Кэш открывается один раз на поток процесса (соединение SQLite нельзя делить)
+_local = threading.local()
+
+
+def _get_cache(settings):
+    max_mb = int(settings.get('cache_max_mb', 1024))
+    if max_mb <= 0:
+        return None
+
+    cache_dir = settings.get('cache_dir') or default_cache_dir()
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.caches = {}
+
+    cache = _local.caches.get(cache_dir)
+    if cache is None:
+        cache = CompressionCache(cache_dir, max_mb * 1024 * 1024)
+        _local.caches[cache_dir] = cache
+    cache.max_bytes = max_mb * 1024 * 1024
+    return cache
+
+
+def cache_key(image_path, settings):
+    """Ключ кэша: хэш содержимого исходника и параметров сжатия.
+
+    Бюджет памяти меняет результат, только если кадр в него не помещается,
+    поэтому в ключ входит примененный коэффициент уменьшения, а не бюджет.
+    """
+    params = [settings.get(key) for key in OUTPUT_SETTINGS]
+    params.append(image_reduce_factor(image_path, settings))
+    return hash_file(image_path, repr(params).encode())
+
+
+def _add_time(timings, stage, started):
+    """Прибавляет время этапа, если замер включен (timings не None)"""
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.monotonic() - started
+
+
+def compress_image(image_path, settings, output_dir=None, timings=None, messages=None):
+    """Сжимает изображение и возвращает путь к результату.
+
+    Функция объявлена на уровне модуля, чтобы её можно было выполнять
+    в пуле процессов (сигналы Qt между процессами не передаются).
+    Повторно встреченный исходник берется из кэша без перекодирования.
+    Если задан output_dir (рабочая копия репозитория), результат пишется
+    сразу туда по пути из repo_layout, иначе - рядом с исходником.
+    В timings (если передан) добавляется время этапов по run_metrics.STAGES,
+    в messages - сообщения для лога (см. prepare_image).
+    """
+    # Создаем имя файла
+    if output_dir:
+        output_path = os.path.join(output_dir, *layout_path(image_path, settings).split('/'))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    else:
+        output_path = os.path.join(os.path.dirname(image_path), output_name(image_path, settings))
+
+    # Пишем во временный файл и переименовываем, чтобы не оставить недописанный
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        started = time.monotonic()
+        cache = _get_cache(settings)
+        if cache is not None:
+            key = cache_key(image_path, settings)
+            cached_path = cache.get(key)
+            if cached_path:
+                shutil.copyfile(cached_path, tmp_path)
+                os.replace(tmp_path, output_path)
+                _add_time(timings, 'cache', started)
+                return output_path
+        _add_time(timings, 'cache', started)
+
+        encode_image(image_path, tmp_path, settings, timings, messages)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if cache is not None:
+        started = time.monotonic()
+        cache.put(key, output_path)
+        _add_time(timings, 'cache', started)
+    return output_path
+
+
+def prepare_image(img, settings, timings=None, messages=None):
+    """Приводит открытое изображение к нужному режиму и размеру.
+
+    Кадр больше max_decode_pixels (бюджет памяти, см. memory_budget.py)
+    сохраняется уменьшенным до этого предела, о чем в messages (если
+    передан) добавляется сообщение. Кадр, который нельзя декодировать
+    в бюджет, вызывает ValueError.
+    """
+    max_size = settings['max_size']
+    fast = settings['resize_enabled'] and settings.get('fast_resize', True)
+
+    band = band_pixels(img)
+    check_decodable(img.size, img.format, band > 0, settings)
+    budget_factor = reduce_factor(img.size, settings)
+    if budget_factor > 1 and messages is not None:
+        messages.append(f"Кадр {img.size[0]}x{img.size[1]} не помещается в бюджет памяти "
+                        f"и сохранен с коэффициентом уменьшения {budget_factor}")
+
+    # JPEG сразу декодируется в уменьшенном масштабе (1/2, 1/4, 1/8 через DCT).
+    # Вызывать нужно до convert(), пока изображение еще не загружено
+    target = decode_target(img.size, settings, FAST_REDUCING_GAP)
+    if target:
+        img.draft(None, target)
+
+    # Явная загрузка отделяет время декодирования от уменьшения.
+    # Тайловый TIFF сверх бюджета декодируется по рядам тайлов уже уменьшенным
+    started = time.monotonic()
+    reduced = load_reduced(img, budget_factor) if band and budget_factor > 1 else None
+    if reduced is None:
+        img.load()
+    else:
+        img = reduced
+    _add_time(timings, 'decode', started)
+
+    started = time.monotonic()
+    # Кадр больше бюджета (не JPEG или JPEG сверх 1/8) уменьшается усреднением
+    # блоков: в отличие от resize() промежуточной копии в полный размер нет
+    factor = reduce_factor(img.size, settings) if reduced is None else 1
+    if factor > 1:
+        if img.mode == 'P':
+            img = img.convert('RGB')
+        img = img.reduce(factor)
+
+    # Конвертируем в RGB если нужно (для JPEG)
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+
+    # Изменяем размер если нужно
+    if fast:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS, reducing_gap=FAST_REDUCING_GAP)
+    elif settings['resize_enabled']:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    _add_time(timings, 'resize', started)
+    return img
+
+
+def compress_to_bytes(image_path, settings, timings=None, messages=None):
+    """Сжимает изображение в память, возвращает (путь в репозитории, байты).
+
+    Используется, когда результат пишется в репозиторий напрямую
+    объектами git (см. fast_import.py), минуя файловую систему.
+    """
+    name = layout_path(image_path, settings)
+
+    started = time.monotonic()
+    cache = _get_cache(settings)
+    if cache is not None:
+        key = cache_key(image_path, settings)
+        cached_path = cache.get(key)
+        if cached_path:
+            with open(cached_path, 'rb') as f:
+                data = f.read()
+            _add_time(timings, 'cache', started)
+            return name, data
+    _add_time(timings, 'cache', started)
+
+    buffer = io.BytesIO()
+    encode_image(image_path, buffer, settings, timings, messages)
+    data = buffer.getvalue()
+
+    if cache is not None:
+        started = time.monotonic()
+        cache.put_bytes(key, data, os.path.splitext(name)[1])
+        _add_time(timings, 'cache', started)
+    return name, data
+
+
+def encode_image(image_path, output_path, settings, timings=None, messages=None):
+    """Декодирует, при необходимости уменьшает и кодирует изображение.
+
+    output_path может быть путем или файловым объектом.
+    """
+    with open_image(image_path, settings) as img:
+        img = prepare_image(img, settings, timings, messages)
+
+        # Определяем формат сохранения
+        save_format = FORMAT_MAP.get(settings['compression_format'], 'WEBP')
+
+        # Сохраняем с нужным качеством и усилием кодировщика
+        effort = settings.get('effort', 'balanced')
+        save_params = {'quality': settings['compression_quality']}
+        save_params.update(EFFORT_PRESETS.get(effort, EFFORT_PRESETS['balanced'])[save_format])
+
+        started = time.monotonic()
+        img.save(output_path, save_format, **save_params)
+        _add_time(timings, 'encode', started)
+
+
+def in_memory_result(output):
+    """Проверяет, что результат обработки получен в память, а не файлом"""
+    return isinstance(output, tuple)
+
+
+def _process_one(image_path, settings, output_dir=None, in_memory=False):
+    """Обрабатывает файл, не пробрасывая исключения наружу.
+
+    Возвращает (image_path, результат, ошибка, время по этапам, сообщения для лога).
+    """
+    timings = {}
+    messages = []
+    try:
+        if in_memory:
+            output = compress_to_bytes(image_path, settings, timings, messages)
+        else:
+            output = compress_image(image_path, settings, output_dir, timings, messages)
+        return image_path, output, None, timings, messages
+    except Exception as e:
+        return image_path, None, str(e), timings, messages
+
+
+def _process_chunk(image_paths, settings, output_dir=None, in_memory=False):
+    """Обрабатывает пачку файлов в одном процессе пула"""
+    return [_process_one(image_path, settings, output_dir, in_memory) for image_path in image_paths]
+
+
+class AdaptiveEffort:
+    """Выбор усилия кодировщика под бюджет времени на пакет (режим auto).
+
+    Пакет начинается с максимального усилия. Если измеренная на текущем
+    уровне скорость не позволяет закончить оставшиеся файлы в бюджет,
+    усилие понижается на одну ступень. Уровень применяется к задачам,
+    отправленным в пул после изменения.
+    """
+
+    def __init__(self, total, time_budget, min_samples):
+        self.total = total
+        self.time_budget = time_budget
+        self.min_samples = min_samples
+        self.level = 0
+        self.done = 0
+        self.started = time.monotonic()
+        self.level_started = self.started
+        self.level_done = 0
+
+    @property
+    def effort(self):
+        return EFFORT_LEVELS[self.level]
+
+    def record(self):
+        """Учитывает готовый файл, возвращает True, если уровень понижен"""
+        self.done += 1
+        self.level_done += 1
+        if self.level == len(EFFORT_LEVELS) - 1 or self.level_done < self.min_samples:
+            return False
+
+        now = time.monotonic()
+        time_left = self.time_budget - (now - self.started)
+        rate = self.level_done / max(now - self.level_started, 1e-6)
+        if time_left > 0 and (self.total - self.done) / rate <= time_left:
+            return False
+
+        self.level += 1
+        self.level_started = now
+        self.level_done = 0
+        return True
+
 
 class ImageProcessor:
-    def __init__(self, settings, log_signal):
+    def __init__(self, settings, log_signal, metrics=None):
         self.settings = settings
         self.log_signal = log_signal
+        # RunMetrics запуска: время этапов и счетчики файлов
+        self.metrics = metrics
+
+    def process_many(self, image_paths, ordered=True, output_dir=None, in_memory=False):
+        """Обрабатывает список файлов в пуле процессов.
+
+        Генератор возвращает кортежи (image_path, output_path, error).
+        При ordered=True результаты идут в порядке входного списка,
+        иначе - по мере готовности. Ошибка одного файла не прерывает пакет:
+        для него output_path равен None, а error содержит текст ошибки.
+        В работе одновременно не больше двух задач на процесс, поэтому
+        число еще не забранных сжатых файлов на диске ограничено.
+        output_dir - каталог для результатов (см. compress_image).
+        При in_memory=True вместо пути возвращается кортеж (имя файла, байты).
+
+        При заданном memory_budget_mb задачи допускаются в пул по оценке
+        памяти из заголовков файлов: пока сумма оценок отправленных задач
+        вместе с новой превышает бюджет, сначала забираются готовые
+        результаты. Задача больше всего бюджета выполняется одна.
+        """
+        image_paths = list(image_paths)
+        workers = max(1, int(self.settings.get('workers', os.cpu_count() or 1)))
+        chunk_size = max(1, int(self.settings.get('chunk_size', 4)))
+
+        # В режиме auto уровень усилия подбирается по ходу пакета
+        adaptive = None
+        if self.settings.get('effort') == 'auto':
+            adaptive = AdaptiveEffort(len(image_paths), float(self.settings.get('time_budget', 600)),
+                                      min_samples=workers * chunk_size * 2)
+
+        if workers == 1 or len(image_paths) <= 1:
+            results = (_process_one(image_path, self._task_settings(adaptive), output_dir, in_memory)
+                       for image_path in image_paths)
+            yield from self._report(results, adaptive)
+            return
+
+        max_pending = workers * 2
+        budget = budget_bytes(self.settings)
+        costs = {}
+        # Пул создается из QThread в многопоточном процессе: fork скопировал бы
+        # захваченные другими потоками блокировки, поэтому процессы запускаются заново
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(image_paths)),
+                                       mp_context=multiprocessing.get_context('spawn'))
+        pending = deque() if ordered else set()
+
+        def take_next():
+            future = self._take(pending, ordered)
+            costs.pop(future, None)
+            return future.result()
 
-    def process(self, image_path):
         try:
-            with Image.open(image_path) as img:
-                # Конвертируем в RGB если нужно (для JPEG)
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-
-                # Изменяем размер если нужно
-                if self.settings['resize_enabled']:
-                    img.thumbnail((self.settings['max_size'], self.settings['max_size']), Image.Resampling.LANCZOS)
-
-                # Определяем формат сохранения
-                format_map = {
-                    'webp': 'WEBP',
-                    'jpeg': 'JPEG',
-                    'avif': 'AVIF'
-                }
-                save_format = format_map.get(self.settings['compression_format'], 'WEBP')
-
-                # Создаем имя файла
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                output_path = os.path.join(
-                    os.path.dirname(image_path),
-                    f"{base_name}_compressed.{self.settings['compression_format']}"
-                )
-
-                # Сохраняем с нужным качеством
-                save_params = {
-                    'quality': self.settings['compression_quality'],
-                    'optimize': True
-                }
-
-                # Особые параметры для WebP
-                if save_format == 'WEBP':
-                    save_params['method'] = 6  # Максимальное сжатие
-
-                img.save(output_path, save_format, **save_params)
-
-                self.log_signal.emit(f"Изображение обработано: {output_path}")
-                return output_path
+            for i in range(0, len(image_paths), chunk_size):
+                chunk = image_paths[i:i + chunk_size]
+                if budget:
+                    cost = self._chunk_cost(chunk, budget)
+                    while pending and sum(costs.values()) + cost > budget:
+                        yield from self._report(take_next(), adaptive)
+
+                future = executor.submit(_process_chunk, chunk,
+                                         self._task_settings(adaptive), output_dir, in_memory)
+                if budget:
+                    costs[future] = cost
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+
+                while len(pending) >= max_pending:
+                    yield from self._report(take_next(), adaptive)
+
+            while pending:
+                yield from self._report(take_next(), adaptive)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _take(pending, ordered):
+        """Забирает следующую задачу: первую по порядку или первую готовую"""
+        if ordered:
+            return pending.popleft()
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        future = done.pop()
+        pending.remove(future)
+        return future
+
+    def _chunk_cost(self, chunk, budget):
+        """Оценка памяти задачи: файлы пачки обрабатываются по очереди,
+        поэтому учитывается самый большой из них (но не больше бюджета)"""
+        cost = max(estimate_bytes(image_path, self.settings, FAST_REDUCING_GAP) for image_path in chunk)
+        return min(cost, budget)
+
+    def _task_settings(self, adaptive):
+        """Настройки для очередной задачи с текущим уровнем усилия"""
+        if adaptive is None:
+            return self.settings
+        return dict(self.settings, effort=adaptive.effort)
+
+    def _report(self, results, adaptive=None):
+        """Пишет в лог ошибки и сообщения обработки (ход пакета передается прогрессом)"""
+        for image_path, output_path, error, timings, messages in results:
+            if self.metrics:
+                self.metrics.add_timings(timings)
+            for message in messages:
+                self.log_signal.emit(f"{message}: {image_path}")
+            if error is not None:
+                self.log_signal.emit(f"Ошибка обработки изображения {image_path}: {error}")
 
-        except Exception as e:
-            self.log_signal.emit(f"Ошибка обработки изображения {image_path}: {str(e)}")
-            return None
\ No newline at end of file
+            if adaptive is not None and adaptive.record():
+                self.log_signal.emit(f"Пакет не укладывается в бюджет времени, "
+                                     f"усилие кодировщика снижено до {adaptive.effort}")
+            yield image_path, output_path, error
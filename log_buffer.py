@@ -0,0 +1,34 @@
+import threading
+import time
+from collections import deque
+
+
+class LogBuffer:
+    """Потокобезопасный кольцевой буфер сообщений лога.
+
+    Заменяет log_signal: emit() можно вызывать из любого потока, сообщение
+    только добавляется в буфер. Виджет забирает накопленное пачкой (drain)
+    по таймеру. Если между выборками приходит больше max_lines сообщений,
+    старые вытесняются, а их число возвращается вместе с пачкой.
+    """
+
+    def __init__(self, max_lines=1000):
+        self.lines = deque(maxlen=max_lines)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def emit(self, message):
+        line = f"{time.strftime('%H:%M:%S')}: {message}"
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(line)
+
+    def drain(self):
+        """Забирает накопленные строки, возвращает (строки, число вытесненных)"""
+        with self.lock:
+            lines = list(self.lines)
+            dropped = self.dropped
+            self.lines.clear()
+            self.dropped = 0
+        return lines, dropped
@@ -1,6 +1,16 @@
 import sys
-from app import ImageBackupApp
+import multiprocessing
 
 if __name__ == '__main__':
+    # Нужно для пула процессов сжатия в собранном приложении
+    multiprocessing.freeze_support()
+
+    # С командой в аргументах работаем без GUI (см. cli.py)
+    from cli import COMMANDS
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from app import ImageBackupApp
     app = ImageBackupApp(sys.argv)
-    sys.exit(app.run())
\ No newline at end of file
+    sys.exit(app.run())
@@ -0,0 +1,161 @@
+import math
+import threading
+from PIL import Image
+
+from tiled_tiff import band_pixels
+
+
+# Оценка памяти на пиксель: декодированный кадр (до 4 байт на пиксель)
+# и еще одна копия того же размера при convert/thumbnail
+BYTES_PER_PIXEL = 4
+DECODE_COPIES = 2
+
+# Наибольший коэффициент уменьшения при декодировании JPEG (draft, через DCT)
+MAX_DRAFT_FACTOR = 8
+
+# Предел Pillow на размер кадра, когда бюджет не задан
+DEFAULT_MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS
+
+# Image.MAX_IMAGE_PIXELS общий для процесса, open_image меняет его под блокировкой
+_max_pixels_lock = threading.Lock()
+
+
+def budget_bytes(settings):
+    """Бюджет памяти на декодирование всего пула, 0 - без ограничения"""
+    return max(0, int(settings.get('memory_budget_mb', 0))) * 1024 * 1024
+
+
+def max_decode_pixels(settings):
+    """Предельное число пикселей декодируемого кадра или 0 (без ограничения)"""
+    budget = budget_bytes(settings)
+    return budget // (BYTES_PER_PIXEL * DECODE_COPIES) if budget else 0
+
+
+def max_image_pixels(settings):
+    """Предел Pillow на размер кадра (Image.MAX_IMAGE_PIXELS) для бюджета.
+
+    Больший кадр не помещается в бюджет даже в масштабе 1/8 (JPEG).
+    Без бюджета остается предел Pillow по умолчанию.
+    """
+    limit = max_decode_pixels(settings)
+    return limit * MAX_DRAFT_FACTOR ** 2 if limit else DEFAULT_MAX_IMAGE_PIXELS
+
+
+def open_image(image_path, settings):
+    """Открывает изображение с пределом размера кадра по бюджету памяти.
+
+    Иначе Pillow отказывается открывать кадры больше 2 * MAX_IMAGE_PIXELS
+    (около 179 млн пикселей), и уменьшенное декодирование до них не доходит.
+    Предел действует только на время Image.open, затем возвращается
+    прежний: остальные открытия в процессе (например, миниатюры)
+    сохраняют защиту Pillow от слишком больших кадров.
+    """
+    with _max_pixels_lock:
+        previous = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = max_image_pixels(settings)
+        try:
+            return Image.open(image_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = previous
+
+
+def read_header(image_path, settings):
+    """Размеры, формат и пикселей в ряду тайлов (0 - не тайловый TIFF) из
+    заголовка изображения (пиксели не декодируются)"""
+    with open_image(image_path, settings) as img:
+        return img.size, img.format, band_pixels(img)
+
+
+def reduce_factor(size, settings):
+    """Целый коэффициент уменьшения кадра, не помещающегося в бюджет (1 - не нужно)"""
+    limit = max_decode_pixels(settings)
+    pixels = size[0] * size[1]
+    if not limit or pixels <= limit:
+        return 1
+    return math.ceil(math.sqrt(pixels / limit))
+
+
+def draft_factor(size, image_format, target):
+    """Во сколько раз JPEG уменьшается при декодировании до target (как в draft)"""
+    if image_format != 'JPEG' or not target:
+        return 1
+    factor = 1
+    while (factor < MAX_DRAFT_FACTOR and size[0] // (factor * 2) >= target[0]
+           and size[1] // (factor * 2) >= target[1]):
+        factor *= 2
+    return factor
+
+
+def decode_target(size, settings, reducing_gap):
+    """Размер, до которого изображение можно уменьшить уже при декодировании.
+
+    Учитывает быстрое уменьшение (fast_resize) и бюджет памяти: кадр
+    больше max_decode_pixels уменьшается в reduce_factor раз. None -
+    декодируется полный кадр.
+    """
+    width, height = size
+    target = None
+    if settings['resize_enabled'] and settings.get('fast_resize', True):
+        max_size = settings['max_size']
+        scale = min(max_size / width, max_size / height)
+        if scale < 1:
+            target = (int(width * scale * reducing_gap), int(height * scale * reducing_gap))
+
+    factor = reduce_factor(size, settings)
+    if factor > 1:
+        limited = (max(1, width // factor), max(1, height // factor))
+        if target is None or limited[0] < target[0]:
+            target = limited
+    return target
+
+
+def image_reduce_factor(image_path, settings):
+    """Коэффициент уменьшения файла из-за бюджета (по заголовку, 1 - не нужно)"""
+    if not budget_bytes(settings):
+        return 1
+    try:
+        size, _, _ = read_header(image_path, settings)
+    except Exception:
+        return 1
+    return reduce_factor(size, settings)
+
+
+def check_decodable(size, image_format, tiled, settings):
+    """Проверяет, что кадр можно декодировать в пределах бюджета.
+
+    JPEG (draft) и тайловый TIFF (по рядам тайлов) декодируются сразу
+    уменьшенными, остальные форматы загружаются полным кадром, и он
+    должен помещаться в бюджет хотя бы в одной копии.
+    """
+    budget = budget_bytes(settings)
+    if not budget or image_format == 'JPEG' or tiled:
+        return
+    if size[0] * size[1] * BYTES_PER_PIXEL > budget:
+        raise ValueError(f"кадр {size[0]}x{size[1]} не помещается в бюджет памяти "
+                         f"{budget // (1024 * 1024)} МБ")
+
+
+def estimate_bytes(image_path, settings, reducing_gap):
+    """Оценка памяти на обработку файла.
+
+    Читается только заголовок. Нечитаемый файл (в том числе слишком
+    большой для Pillow) оценивается во весь бюджет: декодировать его
+    вместе с другими нельзя, а ошибку сообщит обработка. JPEG
+    учитывается в масштабе draft, тайловый TIFF сверх бюджета - уже
+    уменьшенным кадром и одним рядом тайлов, остальные форматы
+    декодируются полным кадром.
+    """
+    try:
+        size, image_format, band = read_header(image_path, settings)
+    except Exception:
+        return budget_bytes(settings)
+
+    factor = reduce_factor(size, settings)
+    if band and factor > 1:
+        pixels = math.ceil(size[0] / factor) * math.ceil(size[1] / factor)
+        # Ряд тайлов и его склейка с остатком предыдущего ряда
+        return (pixels * DECODE_COPIES + band * 2) * BYTES_PER_PIXEL
+
+    factor = draft_factor(size, image_format, decode_target(size, settings, reducing_gap))
+    pixels = (size[0] // factor) * (size[1] // factor)
+    return pixels * BYTES_PER_PIXEL * DECODE_COPIES
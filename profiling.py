@@ -0,0 +1,93 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+from run_metrics import default_logs_dir
+
+
+# Переменная окружения, включающая профилирование независимо от настроек
+PROFILE_ENV = "IMAGE_BACKUP_PROFILE"
+
+# Сколько строк выводить в отчетах
+TOP_N = 30
+
+
+def profiling_enabled(settings):
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0') or bool(settings.get('profiling', False))
+
+
+def default_profiles_dir():
+    return os.path.join(default_logs_dir(), "profiles")
+
+
+def profiled(name):
+    """Декоратор метода ScanWorker: профилирует запуск, если режим включен.
+
+    Когда профилирование выключено, выполняется только проверка флага.
+    Иначе вызов идет под cProfile (поток, в котором выполняется метод)
+    и tracemalloc (выделения памяти всех потоков процесса), а в
+    logs/profiles/ сохраняются дамп <время>-<name>.prof для pstats или
+    snakeviz и текстовый отчет <время>-<name>.txt с самыми затратными
+    функциями и местами выделения памяти.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not profiling_enabled(self.settings):
+                return method(self, *args, **kwargs)
+            return run_profiled(name, self.log_signal, method, self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_profiled(name, log_signal, func, *args, **kwargs):
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    started = time.monotonic()
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        duration = time.monotonic() - started
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            report_path = save_profile(name, profiler, snapshot, peak, duration)
+            log_signal.emit(f"Профиль сохранен: {report_path}")
+        except OSError as e:
+            log_signal.emit(f"Не удалось сохранить профиль: {str(e)}")
+
+
+def save_profile(name, profiler, snapshot, peak, duration, profiles_dir=None):
+    """Пишет дамп cProfile и отчет; возвращает путь к отчету"""
+    profiles_dir = profiles_dir or default_profiles_dir()
+    os.makedirs(profiles_dir, exist_ok=True)
+    base_path = os.path.join(profiles_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+    profiler.dump_stats(base_path + ".prof")
+
+    stream = io.StringIO()
+    stream.write(f"{name}: {duration:.2f} с, пик памяти (tracemalloc) {peak / 1024 / 1024:.1f} МБ\n\n")
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_N)
+
+    stream.write(f"Выделения памяти, оставшиеся к концу запуска (топ {TOP_N}):\n")
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    for stat in snapshot.statistics('lineno')[:TOP_N]:
+        stream.write(f"{stat}\n")
+
+    report_path = base_path + ".txt"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write(stream.getvalue())
+    return report_path
@@ -0,0 +1,62 @@
+import time
+
+
+def format_bytes(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def format_progress(progress):
+    """Строка прогресса: 120/1000, 35.2 МБ -> 8.1 МБ, осталось 2:15"""
+    text = (f"{progress['done']}/{progress['total']}, "
+            f"{format_bytes(progress['bytes_in'])} -> {format_bytes(progress['bytes_out'])}")
+    if progress['failed']:
+        text += f", ошибок {progress['failed']}"
+    if progress['eta'] is not None and progress['done'] < progress['total']:
+        minutes, seconds = divmod(int(progress['eta']), 60)
+        text += f", осталось {minutes}:{seconds:02d}"
+    return text
+
+
+class ProgressTracker:
+    """Считает обработанные файлы и объем и сообщает прогресс словарем.
+
+    Вместо текстовой строки на каждый файл callback получает
+    {'done', 'total', 'failed', 'bytes_in', 'bytes_out', 'elapsed', 'eta'}
+    не чаще раза в interval секунд и обязательно после последнего файла.
+    eta - оценка оставшихся секунд по средней скорости (None до первого файла).
+    """
+
+    def __init__(self, total, callback, interval=0.25):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started = time.monotonic()
+        self.last_report = None
+
+    def advance(self, bytes_in=0, bytes_out=0, failed=False):
+        self.done += 1
+        self.failed += bool(failed)
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+        now = time.monotonic()
+        if self.done >= self.total or self.last_report is None or now - self.last_report >= self.interval:
+            self.last_report = now
+            self.callback(self.snapshot(now))
+
+    def snapshot(self, now=None):
+        elapsed = (now or time.monotonic()) - self.started
+        eta = None
+        if self.done:
+            eta = elapsed / self.done * max(self.total - self.done, 0)
+        return {'done': self.done, 'total': self.total, 'failed': self.failed,
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                'elapsed': round(elapsed, 3), 'eta': eta}
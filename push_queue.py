@@ -0,0 +1,146 @@
+import json
+import os
+import random
+import threading
+import time
+
+
+class PushQueue:
+    """Фоновая отправка локальных коммитов.
+
+    Коммиты создаются локально сразу, а push выполняет отдельный поток,
+    объединяя несколько коммитов в одну отправку: после push_batch_commits
+    коммитов или через push_delay секунд после первого неотправленного.
+    Неудачная отправка повторяется с экспоненциально растущей задержкой
+    (не больше push_max_backoff секунд), поэтому без сети работа
+    продолжается локально. Ошибка аутентификации останавливает повторы
+    до следующего коммита.
+
+    Неотправленные коммиты хранятся в самом репозитории, а число попыток
+    и время следующей - в .git/image_backup_push.json, поэтому после
+    перезапуска отправка продолжается с того же места (см. resume).
+    """
+
+    STATE_FILE = "image_backup_push.json"
+    RETRY_BASE = 5
+
+    def __init__(self, git_manager):
+        self.git_manager = git_manager
+        self.cond = threading.Condition()
+        self.pending = 0
+        self.pending_since = None
+        self.auth_failed = False
+        self.thread = None
+        self.resumed = False
+        self.state = {}
+
+    @property
+    def settings(self):
+        return self.git_manager.settings
+
+    def notify(self, commits=1):
+        """Сообщает о новых локальных коммитах"""
+        with self.cond:
+            self.pending += commits
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            self.auth_failed = False
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def resume(self):
+        """Подхватывает коммиты, не отправленные до перезапуска программы"""
+        if self.resumed:
+            return
+        self.resumed = True
+        self.state = self._load()
+        unpushed = self.git_manager.unpushed_count()
+        if unpushed:
+            self.git_manager.log_signal.emit(f"Неотправленных коммитов: {unpushed}, отправка в фоне")
+            with self.cond:
+                # Накопленное ждать незачем - отправляем при первой возможности
+                self.pending_since = time.monotonic() - float(self.settings.get('push_delay', 30))
+            self.notify(unpushed)
+
+    def push_now(self):
+        """Отправляет накопленные коммиты сразу (например, перед выходом)"""
+        with self.cond:
+            if not self.pending:
+                return True
+        return self._attempt()
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while True:
+                    wait = self._time_to_push()
+                    if wait is not None and wait <= 0:
+                        break
+                    self.cond.wait(timeout=wait)
+            self._attempt()
+
+    def _time_to_push(self):
+        """Секунды до следующей отправки, None - отправлять нечего"""
+        if not self.pending or self.auth_failed:
+            return None
+        now = time.monotonic()
+        if self.pending >= int(self.settings.get('push_batch_commits', 5)):
+            due = now
+        else:
+            due = self.pending_since + float(self.settings.get('push_delay', 30))
+        retry_in = self.state.get('next_attempt', 0) - time.time()
+        return max(due - now, retry_in)
+
+    def _attempt(self):
+        with self.cond:
+            count = self.pending
+
+        result = self.git_manager.push()
+
+        with self.cond:
+            if result is True:
+                self.pending = max(0, self.pending - count)
+                self.pending_since = time.monotonic() if self.pending else None
+                self.state = {'attempts': 0, 'last_push': time.time()}
+                self._log(f"Отправлено коммитов: {count}")
+            else:
+                attempts = self.state.get('attempts', 0) + 1
+                delay = min(self.RETRY_BASE * 2 ** (attempts - 1),
+                            float(self.settings.get('push_max_backoff', 900)))
+                delay *= random.uniform(0.8, 1.2)
+                self.state.update(attempts=attempts, next_attempt=time.time() + delay)
+                if result == 'auth_required':
+                    self.auth_failed = True
+                    self._log("Отправка остановлена до исправления учетных данных")
+                else:
+                    self._log(f"Отправка не удалась, повтор через {delay:.0f} с")
+            self._save()
+        return result
+
+    def _log(self, message):
+        # Вызывается и из фонового потока: объект лога мог быть уже удален
+        try:
+            self.git_manager.log_signal.emit(message)
+        except RuntimeError:
+            pass
+
+    def _state_path(self):
+        return os.path.join(self.git_manager.repo_path, '.git', self.STATE_FILE)
+
+    def _load(self):
+        try:
+            with open(self._state_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        tmp_path = self._state_path() + ".tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self._state_path())
+        except OSError as e:
+            self._log(f"Не удалось сохранить состояние отправки: {str(e)}")
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import time
+
+
+# Структура репозитория:
+#   flat     - все файлы в корне (как раньше; одноименные файлы перезаписывают друг друга)
+#   relative - пути повторяют папки внутри watch_folder
+#   date     - ГГГГ/ММ/ по времени изменения исходника
+#   hash     - ab/cd/ по хэшу пути исходника (65536 каталогов, в каждом по несколько файлов)
+LAYOUTS = ('flat', 'relative', 'date', 'hash')
+
+
+def output_name(image_path, settings):
+    """Имя сжатого файла для исходника"""
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    return f"{base_name}_compressed.{settings['compression_format']}"
+
+
+def unique_name(image_path, settings, tag=None):
+    """Имя с расширением исходника: photo.jpg и photo.png не совпадают"""
+    base_name, ext = os.path.splitext(os.path.basename(image_path))
+    parts = [base_name, ext.lstrip('.').lower()]
+    if tag:
+        parts.append(tag)
+    return f"{'_'.join(parts)}_compressed.{settings['compression_format']}"
+
+
+def _path_hash(path):
+    return hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def _dir_hash(dir_path):
+    return _path_hash(os.path.abspath(dir_path))
+
+
+def _file_hash(image_path, settings):
+    """Хэш пути исходника относительно папки наблюдения (вне ее - абсолютного)"""
+    image_path = os.path.abspath(image_path)
+    watch_folder = settings.get('watch_folder')
+    if watch_folder:
+        rel_path = os.path.relpath(image_path, os.path.abspath(watch_folder))
+        if not rel_path.startswith('..'):
+            # Один и тот же путь на любой ОС дает один и тот же каталог
+            image_path = '/'.join(rel_path.split(os.sep))
+    return _path_hash(image_path)
+
+
+def layout_path(image_path, settings, mtime_ns=None):
+    """Путь сжатого файла в репозитории (через '/', относительно корня).
+
+    Во всех раскладках, кроме flat, путь однозначно определяется
+    исходником, поэтому разные файлы не перезаписывают друг друга, а
+    число записей в одном каталоге git ограничено. mtime_ns нужен
+    раскладке date, если исходника уже нет на диске.
+    """
+    layout = settings.get('repo_layout', 'flat')
+    if layout == 'flat':
+        return output_name(image_path, settings)
+
+    source_dir = os.path.dirname(os.path.abspath(image_path))
+    name = unique_name(image_path, settings)
+
+    if layout == 'relative':
+        watch_folder = settings.get('watch_folder')
+        if watch_folder:
+            rel_dir = os.path.relpath(source_dir, os.path.abspath(watch_folder))
+            if rel_dir == '.':
+                return name
+            if not rel_dir.startswith('..'):
+                return '/'.join(rel_dir.split(os.sep) + [name])
+        # Файл вне папки наблюдения раскладывается по хэшу
+
+    elif layout == 'date':
+        if mtime_ns is None:
+            mtime_ns = os.stat(image_path).st_mtime_ns
+        month = time.strftime('%Y/%m', time.localtime(mtime_ns / 1e9))
+        # Одноименные файлы одного месяца из разных папок различаются меткой папки
+        return f"{month}/{unique_name(image_path, settings, _dir_hash(source_dir)[:6])}"
+
+    # Каталог зависит от самого файла, а не от его папки: большая папка
+    # распределяется по всем каталогам, а не ложится в один
+    digest = _file_hash(image_path, settings)
+    return f"{digest[:2]}/{digest[2:4]}/{name}"
@@ -0,0 +1,143 @@
+import json
+import os
+import subprocess
+import threading
+import time
+
+
+# Задачи обслуживания в порядке выполнения
+TASKS = ('loose-objects', 'incremental-repack', 'commit-graph', 'multi-pack-index')
+
+# Предел размера пакета, собираемого за один запуск (как у git maintenance)
+MAX_BATCH_SIZE = 2 * 1024 ** 3
+
+
+class RepoMaintenance:
+    """Фоновое обслуживание рабочего репозитория.
+
+    Каждая пачка коммитов оставляет в репозитории незапакованные объекты,
+    а fetch - новые пакеты. После операции проверяется число объектов и
+    пакетов (git count-objects), и при превышении порогов
+    maintenance_loose_objects или maintenance_max_packs в отдельном потоке
+    выполняется инкрементальная переупаковка, после нее обновляются граф
+    коммитов и multi-pack-index. Обслуживание держит push_lock, поэтому
+    не пересекается с push. Время выполнения каждой задачи сохраняется
+    в .git/image_backup_maintenance.json.
+    """
+
+    STATE_FILE = "image_backup_maintenance.json"
+    HISTORY_SIZE = 20
+
+    def __init__(self, repo_dir, push_lock, log):
+        self.repo_dir = repo_dir
+        self.push_lock = push_lock
+        self.log = log
+        self.thread = None
+
+    def stats(self):
+        """Число незапакованных объектов и пакетов"""
+        output = self._git('count-objects', '-v')
+        values = dict(line.split(': ', 1) for line in output.splitlines() if ': ' in line)
+        return {'loose': int(values.get('count', 0)), 'packs': int(values.get('packs', 0))}
+
+    def due_tasks(self, stats, settings):
+        tasks = []
+        if stats['loose'] >= int(settings.get('maintenance_loose_objects', 1000)):
+            tasks.append('loose-objects')
+        if stats['packs'] >= int(settings.get('maintenance_max_packs', 10)):
+            tasks.append('incremental-repack')
+        if tasks:
+            tasks.extend(['commit-graph', 'multi-pack-index'])
+        return tasks
+
+    def schedule(self, settings):
+        """Запускает проверку и обслуживание в фоне (если оно еще не идет)"""
+        if self.thread and self.thread.is_alive():
+            return
+        # Поток не фоновый (daemon=False): при выходе из программы
+        # начатая переупаковка доводится до конца
+        self.thread = threading.Thread(target=self._run_safe, args=(dict(settings),))
+        self.thread.start()
+
+    def run(self, settings):
+        """Выполняет нужные задачи, возвращает запись о запуске или None"""
+        with self.push_lock:
+            before = self.stats()
+            tasks = self.due_tasks(before, settings)
+            if not tasks:
+                return None
+
+            started = time.time()
+            timings = {}
+            for name in TASKS:
+                if name not in tasks:
+                    continue
+                task_started = time.monotonic()
+                getattr(self, '_' + name.replace('-', '_'))()
+                timings[name] = round(time.monotonic() - task_started, 3)
+
+            record = {'started': started, 'before': before, 'after': self.stats(), 'timings': timings}
+            self._save(record)
+            return record
+
+    def history(self):
+        try:
+            with open(self._state_path()) as f:
+                return json.load(f).get('runs', [])
+        except (OSError, ValueError):
+            return []
+
+    def _run_safe(self, settings):
+        try:
+            record = self.run(settings)
+            if record:
+                summary = ", ".join(f"{name} {seconds:.1f} с" for name, seconds in record['timings'].items())
+                self.log(f"Обслуживание репозитория: объектов {record['before']['loose']} -> "
+                         f"{record['after']['loose']}, пакетов {record['before']['packs']} -> "
+                         f"{record['after']['packs']} ({summary})")
+        except Exception as e:
+            self.log(f"Ошибка обслуживания репозитория: {str(e)}")
+
+    def _loose_objects(self):
+        # Упаковывает незапакованные объекты в новый пакет и удаляет их копии
+        self._git('repack', '-d', '-q')
+        self._git('prune-packed', '-q')
+
+    def _incremental_repack(self):
+        # Сливает мелкие пакеты через multi-pack-index: в отличие от
+        # repack --geometric это работает и в частичном клоне. Размер порции -
+        # все пакеты, кроме самого большого: он не переписывается
+        pack_dir = os.path.join(self.repo_dir, '.git', 'objects', 'pack')
+        sizes = sorted((os.path.getsize(os.path.join(pack_dir, name))
+                        for name in os.listdir(pack_dir) if name.endswith('.pack')), reverse=True)
+        if len(sizes) < 3:
+            return
+        batch_size = min(sum(sizes[1:]), MAX_BATCH_SIZE)
+        self._git('multi-pack-index', 'write')
+        self._git('multi-pack-index', 'repack', f'--batch-size={batch_size}')
+        self._git('multi-pack-index', 'expire')
+
+    def _commit_graph(self):
+        # Граф коммитов ускоряет обход истории (log, rev-list при fetch и push)
+        self._git('commit-graph', 'write', '--reachable', '--split', '--changed-paths')
+
+    def _multi_pack_index(self):
+        # Общий индекс пакетов: поиск объекта не перебирает пакеты по одному
+        self._git('multi-pack-index', 'write')
+
+    def _git(self, *args):
+        result = subprocess.run(['git', *args], cwd=self.repo_dir,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"git {args[0]}: {result.stderr.strip()}")
+        return result.stdout
+
+    def _state_path(self):
+        return os.path.join(self.repo_dir, '.git', self.STATE_FILE)
+
+    def _save(self, record):
+        runs = self.history()[-(self.HISTORY_SIZE - 1):] + [record]
+        tmp_path = self._state_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'runs': runs}, f, indent=1)
+        os.replace(tmp_path, self._state_path())
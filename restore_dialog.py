@@ -0,0 +1,52 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QFormLayout, QLineEdit, QLabel, QDialogButtonBox
+
+
+class RestoreDialog(QDialog):
+    """Фильтры одного восстановления.
+
+    Фильтры не сохраняются между запусками: без них восстанавливается
+    все, что изменилось с прошлого восстановления.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Восстановление")
+        self.setModal(True)
+
+        layout = QVBoxLayout(self)
+
+        info_label = QLabel(
+            "Оставьте поля пустыми, чтобы восстановить изменения с прошлого раза.\n"
+            "С фильтрами восстанавливаются все подходящие файлы."
+        )
+        info_label.setWordWrap(True)
+        layout.addWidget(info_label)
+
+        form_layout = QFormLayout()
+
+        self.paths_edit = QLineEdit()
+        self.paths_edit.setPlaceholderText("Все файлы (шаблоны через ';', например 2023/*)")
+        form_layout.addRow("Восстанавливать пути:", self.paths_edit)
+
+        self.since_edit = QLineEdit()
+        self.since_edit.setPlaceholderText("2023-05-01")
+        form_layout.addRow("Измененные с даты:", self.since_edit)
+
+        self.until_edit = QLineEdit()
+        self.until_edit.setPlaceholderText("2023-06-01")
+        form_layout.addRow("Измененные до даты:", self.until_edit)
+
+        layout.addLayout(form_layout)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def get_filters(self):
+        """Фильтры в виде ключей настроек для GitManager.restore_repo"""
+        return {
+            'restore_paths': self.paths_edit.text().strip(),
+            'restore_since': self.since_edit.text().strip(),
+            'restore_until': self.until_edit.text().strip(),
+        }
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Этапы в порядке прохождения файла (для сводки; прочие этапы идут следом)
+STAGES = ('init_repo', 'cache', 'decode', 'resize', 'encode', 'copy', 'index_add', 'fast_import',
+          'commit', 'push')
+
+
+def default_logs_dir():
+    """Каталог логов рядом с приложением (как и backup_repo)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "logs")
+
+
+def default_metrics_path():
+    return os.path.join(default_logs_dir(), "metrics.jsonl")
+
+
+class RunMetrics:
+    """Время по этапам и счетчики одного запуска.
+
+    Этапы считаются суммарным временем и числом вызовов. Время
+    декодирования, уменьшения и кодирования измеряется в процессах пула
+    и добавляется через add_timings, поэтому при нескольких процессах
+    сумма по этапам может превышать длительность запуска. Запись
+    потокобезопасна: ее ведут и поток индексации, и фоновый push.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.time()
+        self.started_monotonic = time.monotonic()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.monotonic() - started)
+
+    def add_time(self, name, seconds, count=1):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            stage['seconds'] += seconds
+            stage['count'] += count
+
+    def add_timings(self, timings):
+        """Добавляет словарь этап -> секунды, измеренный для одного файла"""
+        for name, seconds in timings.items():
+            self.add_time(name, seconds)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self, **extra):
+        with self.lock:
+            order = {name: i for i, name in enumerate(STAGES)}
+            stages = {name: {'seconds': round(stage['seconds'], 3), 'count': stage['count']}
+                      for name, stage in sorted(self.stages.items(),
+                                                key=lambda item: order.get(item[0], len(order)))}
+            record = {'kind': self.kind, 'started': round(self.started, 3),
+                      'duration': round(time.monotonic() - self.started_monotonic, 3),
+                      'counters': dict(self.counters), 'stages': stages}
+        record.update(extra)
+        return record
+
+    @staticmethod
+    def format_summary(record):
+        counters = record['counters']
+        text = f"Итоги ({record['kind']}): {record['duration']:.1f} с"
+        if counters:
+            text += ", " + ", ".join(f"{name} {value}" for name, value in counters.items())
+        if record['stages']:
+            text += "; этапы: " + ", ".join(f"{name} {stage['seconds']:.2f} с/{stage['count']}"
+                                            for name, stage in record['stages'].items())
+        return text
+
+    @staticmethod
+    def append(record, path=None):
+        """Дописывает запись строкой JSON в файл метрик"""
+        path = path or default_metrics_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp', '.heic')
+
+
+def is_source_image(file_name):
+    """Проверяет, что файл - исходное изображение, а не результат сжатия"""
+    return file_name.lower().endswith(IMAGE_EXTS) and '_compressed.' not in file_name
+
+
+def default_index_path():
+    """Путь к индексу рядом с приложением (как и backup_repo)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "scan_index.sqlite")
+
+
+class ScanIndex:
+    """Индекс уже зафиксированных файлов на диске (SQLite).
+
+    Для каждого файла хранятся размер, mtime_ns и inode на момент
+    успешной фиксации. Для каталогов хранится mtime_ns: если каталог не
+    менялся и все изображения в нем зафиксированы, при повторном
+    сканировании он не читается, а его подкаталоги берутся из индекса.
+    Изменение содержимого файла без изменения каталога в таком режиме
+    не обнаруживается - для этого есть полное сканирование (full=True).
+
+    Записи хранятся отдельно для каждого репозитория (repo_url): файл,
+    зафиксированный в одном репозитории, для другого остается новым.
+    """
+
+    # Версия схемы: индекс версии 0 не различал репозитории
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path, repo_url):
+        self.db_path = db_path
+        self.repo = repo_url or ''
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            # Старые записи не привязаны к репозиторию: файлы будут найдены заново
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("DROP TABLE IF EXISTS dirs")
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "repo TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+            "PRIMARY KEY (repo, path))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            "repo TEXT, path TEXT, parent TEXT, mtime_ns INTEGER, "
+            "PRIMARY KEY (repo, path))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(repo, parent)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def scan(self, root, full=False):
+        """Возвращает новые или измененные изображения в папке root.
+
+        При full=True индекс не используется вовсе: возвращаются все
+        изображения, в том числе уже зафиксированные.
+        """
+        root = os.path.abspath(root)
+        found_files = []
+        stack = [root]
+
+        while stack:
+            dir_path = stack.pop()
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+
+            if not full and self._dir_unchanged(dir_path, dir_mtime):
+                stack.extend(self._child_dirs(dir_path))
+                continue
+
+            pending = []
+            child_dirs = []
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            child_dirs.append(entry.path)
+                        elif entry.is_file() and is_source_image(entry.name):
+                            if full or self._is_changed(entry.path, entry.stat()):
+                                pending.append(entry.path)
+            except OSError:
+                continue
+
+            self._store_child_dirs(dir_path, child_dirs)
+            stack.extend(child_dirs)
+            found_files.extend(sorted(pending))
+
+            # Каталог запоминаем, только если в нем не осталось незафиксированных файлов
+            if not pending:
+                self._store_dir(dir_path, dir_mtime)
+
+        self.conn.commit()
+        return found_files
+
+    def mark_committed(self, file_paths):
+        """Запоминает состояние успешно зафиксированных файлов"""
+        dirs = set()
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (repo, path, size, mtime_ns, inode) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.repo, file_path, st.st_size, st.st_mtime_ns, st.st_ino)
+            )
+            dirs.add(os.path.dirname(file_path))
+
+        # Каталоги, где теперь все зафиксировано, можно пропускать при сканировании
+        for dir_path in dirs:
+            self._refresh_dir(dir_path)
+
+        self.conn.commit()
+
+    def committed_files(self):
+        """Пары (путь, mtime_ns) всех зафиксированных файлов"""
+        return self.conn.execute(
+            "SELECT path, mtime_ns FROM files WHERE repo = ?", (self.repo,)
+        ).fetchall()
+
+    def forget(self, file_paths):
+        """Забывает файлы, чтобы следующее сканирование нашло их снова"""
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            self.conn.execute("DELETE FROM files WHERE repo = ? AND path = ?",
+                              (self.repo, file_path))
+            self.conn.execute("UPDATE dirs SET mtime_ns = NULL WHERE repo = ? AND path = ?",
+                              (self.repo, os.path.dirname(file_path)))
+        self.conn.commit()
+
+    def _refresh_dir(self, dir_path):
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+            child_dirs = []
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        child_dirs.append(entry.path)
+                    elif entry.is_file() and is_source_image(entry.name):
+                        if self._is_changed(entry.path, entry.stat()):
+                            return
+        except OSError:
+            return
+        self._store_child_dirs(dir_path, child_dirs)
+        self._store_dir(dir_path, dir_mtime)
+
+    def _is_changed(self, file_path, st):
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode FROM files WHERE repo = ? AND path = ?",
+            (self.repo, file_path)
+        ).fetchone()
+        return row is None or row != (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _dir_unchanged(self, dir_path, dir_mtime):
+        row = self.conn.execute(
+            "SELECT mtime_ns FROM dirs WHERE repo = ? AND path = ?", (self.repo, dir_path)
+        ).fetchone()
+        return row is not None and row[0] == dir_mtime
+
+    def _child_dirs(self, dir_path):
+        rows = self.conn.execute("SELECT path FROM dirs WHERE repo = ? AND parent = ?",
+                                 (self.repo, dir_path))
+        return [row[0] for row in rows]
+
+    def _store_child_dirs(self, dir_path, child_dirs):
+        """Запоминает подкаталоги, чтобы обходить их без чтения родителя"""
+        known = set(self._child_dirs(dir_path))
+        for child in known.difference(child_dirs):
+            self.conn.execute("DELETE FROM dirs WHERE repo = ? AND path = ?", (self.repo, child))
+        for child in set(child_dirs).difference(known):
+            self.conn.execute(
+                "INSERT OR IGNORE INTO dirs (repo, path, parent, mtime_ns) VALUES (?, ?, ?, NULL)",
+                (self.repo, child, dir_path)
+            )
+
+    def _store_dir(self, dir_path, dir_mtime):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO dirs (repo, path, parent, mtime_ns) VALUES (?, ?, ?, ?)",
+            (self.repo, dir_path, os.path.dirname(dir_path), dir_mtime)
+        )
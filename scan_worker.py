@@ -3,9 +3,15 @@ import time
 import traceback
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
+from profiling import profiled
+from run_metrics import RunMetrics
+from scan_index import ScanIndex, default_index_path
+
 
 class ScanWorker(QObject):
     log_signal = pyqtSignal(str)
+    # Прогресс фиксации: словарь из progress.ProgressTracker
+    progress_signal = pyqtSignal(dict)
     files_found = pyqtSignal(list)
     finished = pyqtSignal()
     auth_required = pyqtSignal()
@@ -14,12 +20,17 @@ class ScanWorker(QObject):
         super().__init__()
         self.settings = settings
         self.files_to_commit = []
+        # Итог последней фиксации, переноса или восстановления:
+        # True, False, 'auth_required' или 'partial' (фиксация прошла,
+        # но часть файлов не обработана); нужен для кода выхода CLI
+        self.result = None
 
     def set_files_to_commit(self, file_list):
         """Устанавливает список файлов для фиксации"""
         self.files_to_commit = file_list
 
     @pyqtSlot()
+    @profiled('scan')
     def scan(self):
         """Сканирует папку и возвращает список новых изображений"""
         try:
@@ -39,104 +50,190 @@ class ScanWorker(QObject):
             self.finished.emit()
 
     def scan_folder_for_images(self):
-        """Рекурсивно сканирует папку и возвращает список изображений"""
+        """Рекурсивно сканирует папку и возвращает список новых или измененных изображений"""
         try:
-            image_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp', '.heic')
-            found_files = []
-
             watch_folder = self.settings['watch_folder']
 
             if not os.path.exists(watch_folder):
                 self.log_signal.emit(f"Ошибка: Папка {watch_folder} не существует")
                 return []
 
-            for root, dirs, files in os.walk(watch_folder):
-                for file in files:
-                    if file.lower().endswith(image_exts):
-                        image_path = os.path.join(root, file)
-                        # Исключаем уже обработанные файлы
-                        if '_compressed.' not in file:
-                            found_files.append(image_path)
-
-            return found_files
+            # Уже зафиксированные и неизмененные файлы отсекаются по индексу
+            scan_index = ScanIndex(default_index_path(), self.settings['repo_url'])
+            try:
+                return scan_index.scan(watch_folder, full=self.settings.get('full_rescan', False))
+            finally:
+                scan_index.close()
         except Exception as e:
             self.log_signal.emit(f"Ошибка при сканировании папки: {str(e)}")
             return []
 
     @pyqtSlot()
+    @profiled('commit')
     def commit_files(self):
         """Обрабатывает и фиксирует выбранные файлы в репозитории"""
+        self.result = False
         try:
             from git_manager import GitManager
-            from image_processor import ImageProcessor
+            from commit_journal import CommitJournal, default_journal_path
 
-            if not self.files_to_commit:
+            # Продолжаем прерванный запуск: его незафиксированные файлы идут первыми
+            journal = CommitJournal(default_journal_path())
+            files, resumed = journal.start(self.files_to_commit)
+
+            if not files:
+                journal.finish()
                 self.log_signal.emit("Нет файлов для фиксации")
+                self.result = True
                 self.finished.emit()
                 return
 
+            if resumed:
+                self.log_signal.emit(f"Продолжение прерванной фиксации: осталось файлов {resumed}")
+
             self.log_signal.emit("Инициализация репозитория...")
 
-            # Инициализируем репозиторий
-            git_manager = GitManager(self.settings, self.log_signal)
+            # Инициализируем репозиторий (сессия общая для всех фиксаций)
+            git_manager = GitManager.session(self.settings, self.log_signal)
+            with git_manager.lock:
+                git_manager.metrics = RunMetrics('commit')
+                result = 'error'
+                try:
+                    result = self.commit_with(git_manager, journal, files)
+                    self.result = result
+                finally:
+                    metrics, git_manager.metrics = git_manager.metrics, None
+                    self.publish_metrics(metrics, result=str(result))
+        except Exception as e:
+            self.log_signal.emit(f"Ошибка при фиксации файлов: {str(e)}")
+            self.log_signal.emit(traceback.format_exc())
+        finally:
+            self.finished.emit()
+
+    def commit_with(self, git_manager, journal, files):
+        """Фиксирует файлы через сессию репозитория, возвращает результат отправки.
+
+        Если отправка прошла, но часть файлов не обработана, возвращает 'partial'.
+        """
+        from image_processor import ImageProcessor
+        from commit_pipeline import CommitPipeline
+
+        with git_manager.measure('init_repo'):
             result = git_manager.init_repo()
 
+        if result == 'auth_required':
+            self.log_signal.emit("Требуется аутентификация")
+            self.auth_required.emit()
+            return result
+        elif not result:
+            self.log_signal.emit("Ошибка инициализации репозитория")
+            return result
+
+        def on_chunk_committed(sources):
+            journal.mark_done(sources)
+            # Запоминаем исходники, чтобы не показывать их при следующем сканировании
+            self.mark_committed(sources)
+
+        image_processor = ImageProcessor(self.settings, self.log_signal, git_manager.metrics)
+        pipeline = CommitPipeline(self.settings, git_manager, image_processor, self.log_signal,
+                                  on_chunk_committed, progress=self.progress_signal.emit,
+                                  metrics=git_manager.metrics)
+
+        # Сжатие, копирование и коммиты идут одновременно
+        result = pipeline.run(files)
+        journal.finish()
+        git_manager.schedule_maintenance()
+
+        if result == 'auth_required':
+            self.log_signal.emit("Ошибка аутентификации при отправке")
+            self.auth_required.emit()
+        elif not result:
+            self.log_signal.emit("Ошибка отправки, коммиты сохранены локально")
+        elif pipeline.committed_sources:
+            self.log_signal.emit(f"Успешно зафиксировано файлов: {len(pipeline.committed_sources)}")
+        else:
+            self.log_signal.emit("Нет файлов для фиксации")
+
+        if result is True and pipeline.failed:
+            return 'partial'
+        return result
+
+    def publish_metrics(self, metrics, **extra):
+        """Пишет итоги запуска в лог и дописывает их в logs/metrics.jsonl"""
+        record = metrics.summary(**extra)
+        self.log_signal.emit(RunMetrics.format_summary(record))
+        try:
+            RunMetrics.append(record)
+        except OSError as e:
+            self.log_signal.emit(f"Не удалось сохранить метрики: {str(e)}")
+
+    def mark_committed(self, file_paths):
+        """Отмечает исходные файлы как зафиксированные в индексе сканирования"""
+        try:
+            scan_index = ScanIndex(default_index_path(), self.settings['repo_url'])
+            try:
+                scan_index.mark_committed(file_paths)
+            finally:
+                scan_index.close()
+        except Exception as e:
+            self.log_signal.emit(f"Ошибка обновления индекса сканирования: {str(e)}")
+
+    @pyqtSlot()
+    def migrate(self):
+        """Переносит файлы из корня репозитория в выбранную структуру"""
+        self.result = False
+        try:
+            from git_manager import GitManager
+
+            if self.settings.get('repo_layout', 'flat') == 'flat':
+                self.log_signal.emit("Выберите структуру репозитория, отличную от flat")
+                return
+
+            # Исходники зафиксированных файлов известны из индекса сканирования
+            scan_index = ScanIndex(default_index_path(), self.settings['repo_url'])
+            try:
+                sources = scan_index.committed_files()
+
+                self.log_signal.emit("Перенос файлов в новую структуру...")
+                git_manager = GitManager.session(self.settings, self.log_signal)
+                with git_manager.lock:
+                    result = git_manager.init_repo()
+                    if result is True:
+                        result, recommit = git_manager.migrate_layout(sources)
+                        scan_index.forget(recommit)
+            finally:
+                scan_index.close()
+            self.result = result
+
             if result == 'auth_required':
                 self.log_signal.emit("Требуется аутентификация")
                 self.auth_required.emit()
-                self.finished.emit()
-                return
             elif not result:
-                self.log_signal.emit("Ошибка инициализации репозитория")
-                self.finished.emit()
-                return
-
-            image_processor = ImageProcessor(self.settings, self.log_signal)
-            processed_files = []
-
-            # Обрабатываем каждый выбранный файл
-            for i, file_path in enumerate(self.files_to_commit):
-                self.log_signal.emit(
-                    f"Обработка файла {i + 1}/{len(self.files_to_commit)}: {os.path.basename(file_path)}")
-                processed_path = image_processor.process(file_path)
-                if processed_path:
-                    processed_files.append(processed_path)
-
-            if processed_files:
-                # Добавляем все файлы одним коммитом
-                result = git_manager.add_multiple_to_repo(processed_files)
-
-                if result == 'auth_required':
-                    self.log_signal.emit("Ошибка аутентификации при отправке")
-                    self.auth_required.emit()
-                else:
-                    self.log_signal.emit(f"Успешно зафиксировано файлов: {len(processed_files)}")
-
-                    # Очищаем временные файлы после успешной фиксации
-                    for processed_file in processed_files:
-                        try:
-                            if os.path.exists(processed_file):
-                                os.remove(processed_file)
-                        except Exception as e:
-                            self.log_signal.emit(f"Ошибка при удалении временного файла: {str(e)}")
-            else:
-                self.log_signal.emit("Нет файлов для фиксации")
-
+                self.log_signal.emit("Ошибка переноса файлов")
         except Exception as e:
-            self.log_signal.emit(f"Ошибка при фиксации файлов: {str(e)}")
+            self.log_signal.emit(f"Ошибка при переносе файлов: {str(e)}")
             self.log_signal.emit(traceback.format_exc())
         finally:
             self.finished.emit()
 
     @pyqtSlot()
+    @profiled('restore')
     def restore(self):
         """Восстанавливает изображения из репозитория"""
+        self.result = False
         try:
             from git_manager import GitManager
 
             self.log_signal.emit("Начало восстановления...")
-            git_manager = GitManager(self.settings, self.log_signal)
-            if git_manager.restore_repo():
+            git_manager = GitManager.session(self.settings, self.log_signal)
+            with git_manager.lock:
+                restored = git_manager.restore_repo()
+                git_manager.schedule_maintenance()
+            self.result = restored
+            if restored == 'auth_required':
+                self.log_signal.emit("Требуется аутентификация")
+                self.auth_required.emit()
+            elif restored:
                 self.log_signal.emit("Восстановление завершено успешно")
             else:
                 self.log_signal.emit("Ошибка восстановления")
@@ -1,14 +1,174 @@
-from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListWidget,
-                             QListWidgetItem, QPushButton, QLabel,
-                             QDialogButtonBox)
-from PyQt5.QtCore import Qt
+import os
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import compress
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QListView,
+                             QPushButton, QLabel, QLineEdit, QComboBox, QSpinBox,
+                             QCheckBox, QDateEdit, QDialogButtonBox)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QDate, QDateTime, QTimer, QSize
+from PyQt5.QtGui import QPixmap
+
+from thumbnail_cache import ThumbnailLoader, THUMB_SIZE, default_thumb_dir
+
+
+# Сколько готовых миниатюр держать в памяти
+THUMB_MEMORY_ITEMS = 1000
+
+
+class FileListModel(QAbstractListModel):
+    """Список файлов с флажками без объекта на каждую строку.
+
+    Пути хранятся списком строк, отметки - массивом байт (по байту на
+    файл), видимые строки - массивом индексов после фильтрации (без
+    фильтра - range). Представление запрашивает данные только для
+    строк на экране, размеры и даты файлов читаются при первом фильтре
+    по ним. Миниатюры этих же строк запрашиваются у ThumbnailLoader,
+    пока их нет - показывается пустая заглушка.
+    """
+
+    def __init__(self, file_list, parent=None, thumbnails=None):
+        super().__init__(parent)
+        self.paths = list(file_list)
+        self.checked = bytearray(b'\x01') * len(self.paths)
+        self.rows = range(len(self.paths))
+        self.sizes = None
+        self.mtimes = None
+        self.thumbnails = thumbnails
+        self.icons = OrderedDict()
+        if thumbnails is not None:
+            self.placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+            self.placeholder.fill(Qt.transparent)
+            thumbnails.thumbnail_ready.connect(self.set_thumbnail)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        file_index = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.paths[file_index]
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checked[file_index] else Qt.Unchecked
+        if role == Qt.DecorationRole and self.thumbnails is not None:
+            if file_index in self.icons:
+                self.icons.move_to_end(file_index)
+                return self.icons[file_index] or self.placeholder
+            self.thumbnails.request(file_index, self.paths[file_index])
+            return self.placeholder
+        return None
+
+    def set_thumbnail(self, file_index, data):
+        """Принимает миниатюру из фона и перерисовывает ее строку"""
+        pixmap = QPixmap()
+        # Нечитаемый файл запоминается как None, чтобы не запрашивать снова
+        self.icons[file_index] = pixmap if data and pixmap.loadFromData(data) else None
+        if len(self.icons) > THUMB_MEMORY_ITEMS:
+            self.icons.popitem(last=False)
+
+        row = self.row_of(file_index)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def row_of(self, file_index):
+        """Строка файла среди видимых или None"""
+        if isinstance(self.rows, range):
+            return file_index
+        row = bisect_left(self.rows, file_index)
+        if row < len(self.rows) and self.rows[row] == file_index:
+            return row
+        return None
+
+    def file_indexes(self, first_row, last_row):
+        return set(self.rows[first_row:last_row + 1])
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        self.checked[self.rows[index.row()]] = 1 if value == Qt.Checked else 0
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def set_visible_checked(self, checked):
+        """Отмечает или снимает отметку со всех видимых строк"""
+        value = 1 if checked else 0
+        if isinstance(self.rows, range):
+            self.checked[:] = bytes([value]) * len(self.checked)
+        else:
+            for file_index in self.rows:
+                self.checked[file_index] = value
+        if self.rows:
+            self.dataChanged.emit(self.index(0), self.index(len(self.rows) - 1), [Qt.CheckStateRole])
+
+    def checked_count(self):
+        return self.checked.count(1)
+
+    def checked_paths(self):
+        return list(compress(self.paths, self.checked))
+
+    def extensions(self):
+        # У найденных изображений расширение есть всегда, splitext здесь заметно медленнее
+        return sorted({path[path.rfind('.'):].lower() for path in self.paths})
+
+    def set_filter(self, folder='', ext='', min_size=0, max_size=0, since=None):
+        """Оставляет видимыми файлы, подходящие под все заданные условия.
+
+        folder - подстрока пути каталога, ext - расширение, размеры в байтах
+        (0 - без ограничения), since - время изменения не раньше (timestamp).
+        """
+        folder = folder.lower()
+        if min_size or max_size or since is not None:
+            self._load_stats()
+
+        def matches(i):
+            path = self.paths[i]
+            if folder and folder not in os.path.dirname(path).lower():
+                return False
+            if ext and not path.lower().endswith(ext):
+                return False
+            if min_size and self.sizes[i] < min_size:
+                return False
+            if max_size and self.sizes[i] > max_size:
+                return False
+            if since is not None and self.mtimes[i] < since:
+                return False
+            return True
+
+        self.beginResetModel()
+        if folder or ext or min_size or max_size or since is not None:
+            self.rows = array('l', filter(matches, range(len(self.paths))))
+        else:
+            self.rows = range(len(self.paths))
+        self.endResetModel()
+
+    def _load_stats(self):
+        if self.sizes is not None:
+            return
+        self.sizes = array('q', bytes(8 * len(self.paths)))
+        self.mtimes = array('d', bytes(8 * len(self.paths)))
+        for i, path in enumerate(self.paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self.sizes[i] = st.st_size
+            self.mtimes[i] = st.st_mtime
 
 
 class FileSelectionDialog(QDialog):
-    def __init__(self, file_list, parent=None):
+    # Пауза перед применением фильтра при наборе текста
+    FILTER_DELAY_MS = 200
+
+    def __init__(self, file_list, parent=None, settings=None):
         super().__init__(parent)
         self.setWindowTitle("Выбор файлов для фиксации")
-        self.setGeometry(200, 200, 600, 400)
+        self.setGeometry(200, 200, 700, 500)
 
         layout = QVBoxLayout(self)
 
@@ -16,16 +176,56 @@ class FileSelectionDialog(QDialog):
         title_label = QLabel("Найдены новые изображения. Выберите файлы для фиксации:")
         layout.addWidget(title_label)
 
-        # Список файлов с чекбоксами
-        self.list_widget = QListWidget()
-        layout.addWidget(self.list_widget)
+        # Миниатюры: кэш на диске ограничен настройкой thumbnail_cache_mb (0 - без миниатюр)
+        self.thumbnails = None
+        thumb_cache_mb = int((settings or {}).get('thumbnail_cache_mb', 200))
+        if thumb_cache_mb > 0:
+            self.thumbnails = ThumbnailLoader(default_thumb_dir(), thumb_cache_mb * 1024 * 1024, parent=self)
+        self.model = FileListModel(file_list, self, self.thumbnails)
+
+        # Фильтры: влияют на отображение и на кнопки выбора, отметки скрытых файлов сохраняются
+        filter_layout = QHBoxLayout()
+        self.folder_edit = QLineEdit()
+        self.folder_edit.setPlaceholderText("Папка")
+        filter_layout.addWidget(self.folder_edit)
+
+        self.ext_combo = QComboBox()
+        self.ext_combo.addItem("Все типы", "")
+        for ext in self.model.extensions():
+            self.ext_combo.addItem(ext, ext)
+        filter_layout.addWidget(self.ext_combo)
+
+        self.min_size_spin = QSpinBox()
+        self.min_size_spin.setRange(0, 10000000)
+        self.min_size_spin.setSuffix(" КБ")
+        self.min_size_spin.setSpecialValueText("от любого")
+        filter_layout.addWidget(self.min_size_spin)
 
-        # Заполняем список
-        for file_path in file_list:
-            item = QListWidgetItem(file_path)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Checked)
-            self.list_widget.addItem(item)
+        self.max_size_spin = QSpinBox()
+        self.max_size_spin.setRange(0, 10000000)
+        self.max_size_spin.setSuffix(" КБ")
+        self.max_size_spin.setSpecialValueText("до любого")
+        filter_layout.addWidget(self.max_size_spin)
+
+        self.since_check = QCheckBox("Изменены с")
+        filter_layout.addWidget(self.since_check)
+        self.since_edit = QDateEdit(QDate.currentDate().addMonths(-1))
+        self.since_edit.setCalendarPopup(True)
+        self.since_edit.setEnabled(False)
+        self.since_check.toggled.connect(self.since_edit.setEnabled)
+        filter_layout.addWidget(self.since_edit)
+        layout.addLayout(filter_layout)
+
+        # Список файлов с чекбоксами
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        if self.thumbnails is not None:
+            self.list_view.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        # Раскладка строк порциями в цикле событий: окно открывается сразу
+        self.list_view.setLayoutMode(QListView.Batched)
+        self.list_view.setBatchSize(1000)
+        self.list_view.setModel(self.model)
+        layout.addWidget(self.list_view)
 
         # Кнопки выбора всех/ничего
         button_layout = QHBoxLayout()
@@ -34,6 +234,8 @@ class FileSelectionDialog(QDialog):
         button_layout.addWidget(self.select_all_btn)
         button_layout.addWidget(self.select_none_btn)
         button_layout.addStretch()
+        self.count_label = QLabel()
+        button_layout.addWidget(self.count_label)
         layout.addLayout(button_layout)
 
         # Стандартные кнопки диалога
@@ -45,21 +247,61 @@ class FileSelectionDialog(QDialog):
         # Подключаем сигналы
         self.select_all_btn.clicked.connect(self.select_all)
         self.select_none_btn.clicked.connect(self.select_none)
+        self.model.dataChanged.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.folder_edit.textChanged.connect(self.filter_timer.start)
+        self.ext_combo.currentIndexChanged.connect(self.filter_timer.start)
+        self.min_size_spin.valueChanged.connect(self.filter_timer.start)
+        self.max_size_spin.valueChanged.connect(self.filter_timer.start)
+        self.since_check.toggled.connect(self.filter_timer.start)
+        self.since_edit.dateChanged.connect(self.filter_timer.start)
+
+        # После прокрутки отменяем загрузку миниатюр для ушедших с экрана строк
+        self.scroll_timer = QTimer(self)
+        self.scroll_timer.setSingleShot(True)
+        self.scroll_timer.setInterval(self.FILTER_DELAY_MS)
+        self.scroll_timer.timeout.connect(self.drop_hidden_thumbnails)
+        if self.thumbnails is not None:
+            self.list_view.verticalScrollBar().valueChanged.connect(self.scroll_timer.start)
+            self.model.modelReset.connect(self.scroll_timer.start)
+            self.finished.connect(self.thumbnails.close)
+
+        self.update_count()
+
+    def apply_filter(self):
+        since = None
+        if self.since_check.isChecked():
+            since = QDateTime(self.since_edit.date()).toSecsSinceEpoch()
+        self.model.set_filter(folder=self.folder_edit.text().strip(),
+                              ext=self.ext_combo.currentData(),
+                              min_size=self.min_size_spin.value() * 1024,
+                              max_size=self.max_size_spin.value() * 1024,
+                              since=since)
+
+    def drop_hidden_thumbnails(self):
+        viewport = self.list_view.viewport().rect()
+        first = self.list_view.indexAt(viewport.topLeft())
+        last = self.list_view.indexAt(viewport.bottomLeft())
+        if not first.isValid():
+            self.thumbnails.keep_only(set())
+            return
+        last_row = last.row() if last.isValid() else self.model.rowCount() - 1
+        self.thumbnails.keep_only(self.model.file_indexes(first.row(), last_row))
+
+    def update_count(self):
+        self.count_label.setText(f"Показано: {self.model.rowCount()}, "
+                                 f"выбрано: {self.model.checked_count()} из {len(self.model.paths)}")
 
     def select_all(self):
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            item.setCheckState(Qt.Checked)
+        self.model.set_visible_checked(True)
 
     def select_none(self):
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            item.setCheckState(Qt.Unchecked)
+        self.model.set_visible_checked(False)
 
     def get_selected_files(self):
-        selected_files = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.checkState() == Qt.Checked:
-                selected_files.append(item.text())
-        return selected_files
\ No newline at end of file
+        return self.model.checked_paths()
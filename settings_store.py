@@ -0,0 +1,59 @@
+import os
+
+
+# Значения настроек по умолчанию (общие для GUI и командной строки)
+DEFAULT_SETTINGS = {
+    'watch_folder': "",
+    'repo_url': "",
+    'compression_format': "webp",
+    'compression_quality': 85,
+    'effort': "balanced",
+    'time_budget': 600,
+    'resize_enabled': False,
+    'max_size': 1920,
+    'fast_resize': True,
+    'workers': os.cpu_count() or 1,
+    'chunk_size': 4,
+    'memory_budget_mb': 2048,
+    'full_rescan': False,
+    'watch_stable_seconds': 2,
+    'watch_batch_size': 50,
+    'watch_batch_window': 30,
+    'cache_max_mb': 1024,
+    'thumbnail_cache_mb': 200,
+    'commit_batch_size': 100,
+    'direct_output': True,
+    'commit_batch_mb': 256,
+    'push_each_chunk': True,
+    'background_push': True,
+    'push_batch_commits': 5,
+    'push_delay': 30,
+    'push_max_backoff': 900,
+    'ingest_backend': "index",
+    'clone_depth': 0,
+    'partial_clone': False,
+    'sparse_checkout': False,
+    'repo_layout': "flat",
+    'maintenance_enabled': True,
+    'maintenance_loose_objects': 1000,
+    'maintenance_max_packs': 10,
+    'restore_link_mode': "auto",
+    'restore_mode': "worktree",
+    'profiling': False,
+}
+
+
+def load_settings():
+    """Читает сохраненные настройки, приводя значения к типам по умолчанию"""
+    from PyQt5.QtCore import QSettings
+
+    settings = QSettings("ImageBackupTool", "Settings")
+    values = {}
+    for key, default in DEFAULT_SETTINGS.items():
+        if isinstance(default, bool):
+            values[key] = settings.value(key, default, type=bool)
+        elif isinstance(default, int):
+            values[key] = int(settings.value(key, default))
+        else:
+            values[key] = settings.value(key, default)
+    return values
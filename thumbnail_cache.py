@@ -0,0 +1,129 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from compression_cache import CompressionCache
+from tiled_tiff import load_reduced
+
+
+# Сторона миниатюры в пикселях (в списке показывается в том же размере)
+THUMB_SIZE = 64
+
+# Наибольший кадр, который загружается целиком ради миниатюры (до 256 МБ
+# на поток при 4 байтах на пиксель); JPEG и тайловый TIFF не ограничены
+THUMB_MAX_PIXELS = 64 * 1000 * 1000
+
+
+def default_thumb_dir():
+    """Каталог кэша миниатюр рядом с приложением (как и compression_cache)"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "thumbnail_cache")
+
+
+def thumb_key(image_path, st, size=THUMB_SIZE):
+    """Ключ миниатюры: путь, размер и время изменения исходника.
+
+    Содержимое файла не читается: измененный файл получит новый ключ,
+    а старая запись со временем вытеснится из кэша.
+    """
+    ident = f"{os.path.abspath(image_path)}\0{st.st_size}\0{st.st_mtime_ns}\0{size}"
+    return hashlib.blake2b(ident.encode('utf-8', 'surrogateescape'), digest_size=20).hexdigest()
+
+
+def render_thumbnail(image_path, size=THUMB_SIZE):
+    """Декодирует изображение в уменьшенном масштабе и возвращает JPEG-байты.
+
+    JPEG декодируется сразу с уменьшением через DCT (draft), тайловый
+    TIFF - по рядам тайлов (tiled_tiff.load_reduced). Остальные форматы
+    загружаются полным кадром, поэтому кадр больше THUMB_MAX_PIXELS не
+    декодируется (ValueError, файл показывается без миниатюры).
+    """
+    with Image.open(image_path) as img:
+        img.draft('RGB', (size * 2, size * 2))
+        width, height = img.size
+        if img.format != 'JPEG' and width * height > THUMB_MAX_PIXELS:
+            reduced = load_reduced(img, max(1, min(width, height) // (size * 2)))
+            if reduced is None:
+                raise ValueError(f"кадр {width}x{height} слишком велик для миниатюры")
+            img = reduced
+        img.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=80)
+        return buffer.getvalue()
+
+
+class ThumbnailLoader(QObject):
+    """Фоновая загрузка миниатюр для списка файлов.
+
+    Запросы приходят из модели только для строк, которые представление
+    рисует на экране. Миниатюра ищется в дисковом кэше (CompressionCache
+    с ограничением размера и вытеснением давно не использованных), при
+    промахе декодируется в пуле потоков и сохраняется в кэш. Готовый
+    результат передается в поток GUI сигналом thumbnail_ready(номер,
+    байты), поэтому прокрутка не ждет декодирования. Запросы для строк,
+    ушедших с экрана, отменяются (см. keep_only).
+    """
+
+    # Номер файла и JPEG-байты миниатюры (пустые - файл не читается)
+    thumbnail_ready = pyqtSignal(int, bytes)
+
+    def __init__(self, cache_dir, max_bytes, workers=None, parent=None):
+        super().__init__(parent)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1))
+        self.pending = {}
+        self.thumbnail_ready.connect(self._finished)
+        # Соединение SQLite нельзя делить между потоками: кэш свой у каждого
+        self._local = threading.local()
+
+    def request(self, file_index, image_path):
+        """Ставит загрузку в очередь, если она еще не запрошена"""
+        if file_index not in self.pending:
+            self.pending[file_index] = self.pool.submit(self._load, file_index, image_path)
+
+    def keep_only(self, file_indexes):
+        """Отменяет еще не начатые загрузки для файлов вне file_indexes"""
+        for file_index, future in list(self.pending.items()):
+            if file_index not in file_indexes and future.cancel():
+                del self.pending[file_index]
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self, file_index, data):
+        self.pending.pop(file_index, None)
+
+    def _cache(self):
+        cache = getattr(self._local, 'cache', None)
+        if cache is None:
+            cache = CompressionCache(self.cache_dir, self.max_bytes)
+            self._local.cache = cache
+        return cache
+
+    def _load(self, file_index, image_path):
+        try:
+            key = thumb_key(image_path, os.stat(image_path))
+            cache = self._cache()
+            cached_path = cache.get(key)
+            if cached_path:
+                with open(cached_path, 'rb') as f:
+                    data = f.read()
+            else:
+                data = render_thumbnail(image_path)
+                cache.put_bytes(key, data, '.jpg')
+        except Exception:
+            # Нечитаемый файл показывается без миниатюры
+            data = b''
+        try:
+            self.thumbnail_ready.emit(file_index, data)
+        except RuntimeError:
+            # Диалог уже закрыт
+            pass
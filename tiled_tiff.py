@@ -0,0 +1,138 @@
+import io
+import math
+from PIL import Image, TiffImagePlugin
+
+
+# Теги, которые нужны для декодирования одного ряда тайлов
+BAND_TAGS = (
+    258,  # BitsPerSample
+    259,  # Compression
+    262,  # PhotometricInterpretation
+    266,  # FillOrder
+    277,  # SamplesPerPixel
+    284,  # PlanarConfiguration
+    317,  # Predictor
+    320,  # ColorMap
+    338,  # ExtraSamples
+    339,  # SampleFormat
+    347,  # JPEGTables
+    530,  # YCbCrSubSampling
+    531,  # YCbCrPositioning
+    532,  # ReferenceBlackWhite
+)
+
+
+def _tile_layout(img):
+    """Размер тайла и число тайлов в ряду или None, если это не тайловый TIFF"""
+    if img.format != 'TIFF':
+        return None
+    tags = img.tag_v2
+    tile_width = tags.get(TiffImagePlugin.TILEWIDTH)
+    tile_length = tags.get(TiffImagePlugin.TILELENGTH)
+    if not isinstance(tile_width, int) or not isinstance(tile_length, int):
+        return None
+    # Каналы в отдельных плоскостях и BigTIFF по рядам не читаются
+    if tags.get(284, 1) != 1 or getattr(tags, '_bigtiff', False):
+        return None
+    offsets = tags.get(TiffImagePlugin.TILEOFFSETS)
+    counts = tags.get(TiffImagePlugin.TILEBYTECOUNTS)
+    across = math.ceil(img.size[0] / tile_width)
+    down = math.ceil(img.size[1] / tile_length)
+    if not offsets or not counts or len(offsets) < across * down or len(counts) < across * down:
+        return None
+    return tile_width, tile_length, across, down
+
+
+def band_pixels(img):
+    """Пикселей в одном ряду тайлов (0 - изображение не тайловое)"""
+    layout = _tile_layout(img)
+    if layout is None:
+        return 0
+    tile_width, tile_length, across, _ = layout
+    return tile_width * across * tile_length
+
+
+def _band_file(img, layout, row):
+    """Отдельный TIFF из одного ряда тайлов исходного файла.
+
+    Заголовок повторяет теги исходника, данные тайлов копируются как есть,
+    поэтому ряд декодирует тот же кодек (в том числе libtiff).
+    """
+    tile_width, tile_length, across, _ = layout
+    tags = img.tag_v2
+    first = row * across
+    offsets = tags[TiffImagePlugin.TILEOFFSETS][first:first + across]
+    counts = tags[TiffImagePlugin.TILEBYTECOUNTS][first:first + across]
+
+    ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=tags.prefix)
+    for tag in BAND_TAGS:
+        if tag in tags:
+            ifd[tag] = tags[tag]
+            ifd.tagtype[tag] = tags.tagtype[tag]
+    ifd[TiffImagePlugin.IMAGEWIDTH] = tile_width * across
+    ifd[TiffImagePlugin.IMAGELENGTH] = tile_length
+    ifd[TiffImagePlugin.TILEWIDTH] = tile_width
+    ifd[TiffImagePlugin.TILELENGTH] = tile_length
+    ifd[TiffImagePlugin.TILEBYTECOUNTS] = tuple(counts)
+
+    # Длина заголовка не зависит от значений смещений: сначала узнаем,
+    # где начнутся данные, затем записываем настоящие смещения
+    ifd[TiffImagePlugin.TILEOFFSETS] = (0,) * across
+    data_start = ifd.save(io.BytesIO())
+    positions = [data_start]
+    for count in counts[:-1]:
+        positions.append(positions[-1] + count)
+    ifd[TiffImagePlugin.TILEOFFSETS] = tuple(positions)
+
+    band = io.BytesIO()
+    ifd.save(band)
+    for offset, count in zip(offsets, counts):
+        img.fp.seek(offset)
+        band.write(img.fp.read(count))
+    band.seek(0)
+    return band
+
+
+def load_reduced(img, factor):
+    """Декодирует тайловый TIFF по рядам тайлов, уменьшая его в factor раз.
+
+    Результат совпадает с img.reduce(factor) после полной загрузки, но в
+    памяти одновременно находятся лишь уменьшенный кадр и один ряд
+    тайлов. Для нетайлового изображения возвращает None.
+    """
+    layout = _tile_layout(img)
+    if layout is None:
+        return None
+    _, tile_length, _, down = layout
+    width, height = img.size
+
+    result = None
+    carry = None
+    out_y = 0
+    for row in range(down):
+        with Image.open(_band_file(img, layout, row)) as band:
+            band.load()
+            rows = min(tile_length, height - row * tile_length)
+            strip = band.crop((0, 0, width, rows))
+        if strip.mode == 'P':
+            strip = strip.convert('RGB')
+
+        # Остаток строк, не кратный factor, переносится в следующий ряд,
+        # чтобы блоки усреднения совпадали с reduce() по всему кадру
+        if carry is not None:
+            joined = Image.new(strip.mode, (width, carry.height + strip.height))
+            joined.paste(carry, (0, 0))
+            joined.paste(strip, (0, carry.height))
+            strip = joined
+        last = row == down - 1
+        ready = strip.height if last else strip.height - strip.height % factor
+        carry = strip.crop((0, ready, width, strip.height)) if ready < strip.height else None
+        if not ready:
+            continue
+
+        reduced = strip.crop((0, 0, width, ready)).reduce(factor)
+        if result is None:
+            result = Image.new(reduced.mode, (math.ceil(width / factor), math.ceil(height / factor)))
+        result.paste(reduced, (0, out_y))
+        out_y += reduced.height
+    return result
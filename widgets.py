@@ -1,15 +1,27 @@
+import os
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGroupBox,
                              QFormLayout, QLineEdit, QPushButton, QLabel,
-                             QSpinBox, QComboBox, QTextEdit, QFileDialog, QCheckBox)
-from PyQt5.QtCore import QSettings, QDateTime
+                             QSpinBox, QComboBox, QPlainTextEdit, QFileDialog, QCheckBox,
+                             QProgressBar, QTabWidget)
+from PyQt5.QtCore import QSettings, QTimer
+
+from log_buffer import LogBuffer
+from progress import format_progress
+from settings_store import load_settings
 
 
 class SettingsWidget(QGroupBox):
     def __init__(self):
         super().__init__("Настройки")
 
+        main_layout = QVBoxLayout()
+        self.setLayout(main_layout)
+
+        # Основные поля всегда на виду, остальные настройки разложены по вкладкам
         layout = QFormLayout()
-        self.setLayout(layout)
+        main_layout.addLayout(layout)
+        self.tabs = QTabWidget()
+        main_layout.addWidget(self.tabs)
 
         # Поле для выбора папки
         self.folder_layout = QHBoxLayout()
@@ -25,7 +37,11 @@ class SettingsWidget(QGroupBox):
         self.repo_edit.setPlaceholderText("https://github.com/username/repository.git")
         layout.addRow("URL Git репозитория:", self.repo_edit)
 
+        self.full_rescan_check = QCheckBox("Полное сканирование (показать все изображения, включая зафиксированные)")
+        layout.addRow(self.full_rescan_check)
+
         # Настройки сжатия
+        layout = self.add_tab("Сжатие")
         self.format_combo = QComboBox()
         self.format_combo.addItems(["webp", "jpeg", "avif"])
         layout.addRow("Формат сжатия:", self.format_combo)
@@ -36,6 +52,20 @@ class SettingsWidget(QGroupBox):
         self.quality_spin.setSuffix("%")
         layout.addRow("Качество сжатия:", self.quality_spin)
 
+        self.effort_combo = QComboBox()
+        self.effort_combo.addItems(["fast", "balanced", "max", "auto"])
+        self.effort_combo.setCurrentText("balanced")
+        layout.addRow("Усилие кодировщика:", self.effort_combo)
+
+        self.time_budget_spin = QSpinBox()
+        self.time_budget_spin.setRange(1, 86400)
+        self.time_budget_spin.setValue(600)
+        self.time_budget_spin.setSuffix(" с")
+        self.time_budget_spin.setEnabled(False)
+        self.effort_combo.currentTextChanged.connect(
+            lambda text: self.time_budget_spin.setEnabled(text == "auto"))
+        layout.addRow("Бюджет времени на пакет:", self.time_budget_spin)
+
         # Максимальный размер
         self.resize_check = QCheckBox("Изменять размер изображений")
         layout.addRow(self.resize_check)
@@ -48,9 +78,172 @@ class SettingsWidget(QGroupBox):
         self.resize_check.toggled.connect(self.max_size_spin.setEnabled)
         layout.addRow("Максимальный размер:", self.max_size_spin)
 
+        self.fast_resize_check = QCheckBox("Быстрое уменьшение (декодирование в уменьшенном масштабе)")
+        self.fast_resize_check.setChecked(True)
+        self.fast_resize_check.setEnabled(False)
+        self.resize_check.toggled.connect(self.fast_resize_check.setEnabled)
+        layout.addRow(self.fast_resize_check)
+
+        # Параллельная обработка
+        layout = self.add_tab("Обработка")
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(os.cpu_count() or 1)
+        layout.addRow("Процессов сжатия:", self.workers_spin)
+
+        self.chunk_size_spin = QSpinBox()
+        self.chunk_size_spin.setRange(1, 1000)
+        self.chunk_size_spin.setValue(4)
+        layout.addRow("Файлов на задачу:", self.chunk_size_spin)
+
+        self.memory_budget_spin = QSpinBox()
+        self.memory_budget_spin.setRange(0, 1000000)
+        self.memory_budget_spin.setValue(2048)
+        self.memory_budget_spin.setSuffix(" МБ")
+        self.memory_budget_spin.setSpecialValueText("Без ограничения")
+        layout.addRow("Память на декодирование:", self.memory_budget_spin)
+
+        # Кэши
+        self.cache_max_spin = QSpinBox()
+        self.cache_max_spin.setRange(0, 1000000)
+        self.cache_max_spin.setValue(1024)
+        self.cache_max_spin.setSuffix(" МБ")
+        self.cache_max_spin.setSpecialValueText("Отключен")
+        layout.addRow("Кэш сжатых файлов:", self.cache_max_spin)
+
+        self.thumb_cache_spin = QSpinBox()
+        self.thumb_cache_spin.setRange(0, 100000)
+        self.thumb_cache_spin.setValue(200)
+        self.thumb_cache_spin.setSuffix(" МБ")
+        self.thumb_cache_spin.setSpecialValueText("Без миниатюр")
+        layout.addRow("Кэш миниатюр:", self.thumb_cache_spin)
+
+        # Диагностика
+        self.profiling_check = QCheckBox("Профилировать запуски (отчеты в logs/profiles)")
+        layout.addRow(self.profiling_check)
+
+        # Репозиторий
+        layout = self.add_tab("Репозиторий")
+        self.direct_output_check = QCheckBox("Сохранять сжатые файлы сразу в репозиторий")
+        self.direct_output_check.setChecked(True)
+        layout.addRow(self.direct_output_check)
+
+        self.ingest_backend_combo = QComboBox()
+        self.ingest_backend_combo.addItems(["index", "fast-import"])
+        layout.addRow("Способ записи в Git:", self.ingest_backend_combo)
+
+        self.clone_depth_spin = QSpinBox()
+        self.clone_depth_spin.setRange(0, 100000)
+        self.clone_depth_spin.setSpecialValueText("Вся история")
+        layout.addRow("Глубина клонирования:", self.clone_depth_spin)
+
+        self.partial_clone_check = QCheckBox("Частичный клон (файлы докачиваются по требованию)")
+        layout.addRow(self.partial_clone_check)
+
+        self.sparse_checkout_check = QCheckBox("Не выписывать сжатые изображения в рабочую копию")
+        layout.addRow(self.sparse_checkout_check)
+
+        self.maintenance_check = QCheckBox("Обслуживать репозиторий (переупаковка в фоне)")
+        self.maintenance_check.setChecked(True)
+        layout.addRow(self.maintenance_check)
+
+        self.maintenance_loose_spin = QSpinBox()
+        self.maintenance_loose_spin.setRange(10, 1000000)
+        self.maintenance_loose_spin.setValue(1000)
+        self.maintenance_check.toggled.connect(self.maintenance_loose_spin.setEnabled)
+        layout.addRow("Переупаковка после объектов:", self.maintenance_loose_spin)
+
+        self.maintenance_packs_spin = QSpinBox()
+        self.maintenance_packs_spin.setRange(2, 1000)
+        self.maintenance_packs_spin.setValue(10)
+        self.maintenance_check.toggled.connect(self.maintenance_packs_spin.setEnabled)
+        layout.addRow("Объединять пакеты после:", self.maintenance_packs_spin)
+
+        self.repo_layout_combo = QComboBox()
+        self.repo_layout_combo.addItems(["flat", "relative", "date", "hash"])
+        layout.addRow("Структура репозитория:", self.repo_layout_combo)
+
+        # Восстановление (фильтры задаются при каждом запуске)
+        layout = self.add_tab("Восстановление")
+        self.restore_link_combo = QComboBox()
+        self.restore_link_combo.addItems(["auto", "hardlink", "copy"])
+        layout.addRow("Копирование при восстановлении:", self.restore_link_combo)
+
+        self.restore_mode_combo = QComboBox()
+        self.restore_mode_combo.addItems(["worktree", "stream"])
+        layout.addRow("Режим восстановления:", self.restore_mode_combo)
+
+        # Коммиты и отправка
+        layout = self.add_tab("Отправка")
+        self.commit_batch_spin = QSpinBox()
+        self.commit_batch_spin.setRange(1, 100000)
+        self.commit_batch_spin.setValue(100)
+        layout.addRow("Файлов в коммите:", self.commit_batch_spin)
+
+        self.commit_batch_mb_spin = QSpinBox()
+        self.commit_batch_mb_spin.setRange(1, 100000)
+        self.commit_batch_mb_spin.setValue(256)
+        self.commit_batch_mb_spin.setSuffix(" МБ")
+        layout.addRow("Объем коммита:", self.commit_batch_mb_spin)
+
+        self.push_each_chunk_check = QCheckBox("Отправлять каждый коммит сразу")
+        self.push_each_chunk_check.setChecked(True)
+        layout.addRow(self.push_each_chunk_check)
+
+        self.background_push_check = QCheckBox("Отправлять в фоне (коммиты объединяются, повтор без сети)")
+        self.background_push_check.setChecked(True)
+        layout.addRow(self.background_push_check)
+
+        self.push_batch_spin = QSpinBox()
+        self.push_batch_spin.setRange(1, 10000)
+        self.push_batch_spin.setValue(5)
+        self.background_push_check.toggled.connect(self.push_batch_spin.setEnabled)
+        layout.addRow("Отправлять после коммитов:", self.push_batch_spin)
+
+        self.push_delay_spin = QSpinBox()
+        self.push_delay_spin.setRange(0, 86400)
+        self.push_delay_spin.setValue(30)
+        self.push_delay_spin.setSuffix(" с")
+        self.background_push_check.toggled.connect(self.push_delay_spin.setEnabled)
+        layout.addRow("Или через:", self.push_delay_spin)
+
+        self.push_backoff_spin = QSpinBox()
+        self.push_backoff_spin.setRange(5, 86400)
+        self.push_backoff_spin.setValue(900)
+        self.push_backoff_spin.setSuffix(" с")
+        self.background_push_check.toggled.connect(self.push_backoff_spin.setEnabled)
+        layout.addRow("Максимальная пауза между повторами:", self.push_backoff_spin)
+
+        # Слежение за папкой
+        layout = self.add_tab("Слежение")
+        self.watch_stable_spin = QSpinBox()
+        self.watch_stable_spin.setRange(1, 600)
+        self.watch_stable_spin.setValue(2)
+        self.watch_stable_spin.setSuffix(" с")
+        layout.addRow("Ожидание записи файла:", self.watch_stable_spin)
+
+        self.watch_batch_size_spin = QSpinBox()
+        self.watch_batch_size_spin.setRange(1, 10000)
+        self.watch_batch_size_spin.setValue(50)
+        layout.addRow("Файлов в пачке слежения:", self.watch_batch_size_spin)
+
+        self.watch_batch_window_spin = QSpinBox()
+        self.watch_batch_window_spin.setRange(1, 3600)
+        self.watch_batch_window_spin.setValue(30)
+        self.watch_batch_window_spin.setSuffix(" с")
+        layout.addRow("Интервал пачки слежения:", self.watch_batch_window_spin)
+
         # Загрузка настроек
         self.load_settings()
 
+    def add_tab(self, title):
+        """Добавляет вкладку настроек и возвращает ее форму"""
+        tab = QWidget()
+        layout = QFormLayout()
+        tab.setLayout(layout)
+        self.tabs.addTab(tab, title)
+        return layout
+
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Выберите папку для сканирования")
         if folder:
@@ -62,18 +255,80 @@ class SettingsWidget(QGroupBox):
             'repo_url': self.repo_edit.text(),
             'compression_format': self.format_combo.currentText().lower(),
             'compression_quality': self.quality_spin.value(),
+            'effort': self.effort_combo.currentText(),
+            'time_budget': self.time_budget_spin.value(),
             'resize_enabled': self.resize_check.isChecked(),
-            'max_size': self.max_size_spin.value()
+            'max_size': self.max_size_spin.value(),
+            'fast_resize': self.fast_resize_check.isChecked(),
+            'workers': self.workers_spin.value(),
+            'chunk_size': self.chunk_size_spin.value(),
+            'memory_budget_mb': self.memory_budget_spin.value(),
+            'full_rescan': self.full_rescan_check.isChecked(),
+            'watch_stable_seconds': self.watch_stable_spin.value(),
+            'watch_batch_size': self.watch_batch_size_spin.value(),
+            'watch_batch_window': self.watch_batch_window_spin.value(),
+            'cache_max_mb': self.cache_max_spin.value(),
+            'thumbnail_cache_mb': self.thumb_cache_spin.value(),
+            'commit_batch_size': self.commit_batch_spin.value(),
+            'direct_output': self.direct_output_check.isChecked(),
+            'commit_batch_mb': self.commit_batch_mb_spin.value(),
+            'push_each_chunk': self.push_each_chunk_check.isChecked(),
+            'background_push': self.background_push_check.isChecked(),
+            'push_batch_commits': self.push_batch_spin.value(),
+            'push_delay': self.push_delay_spin.value(),
+            'push_max_backoff': self.push_backoff_spin.value(),
+            'ingest_backend': self.ingest_backend_combo.currentText(),
+            'clone_depth': self.clone_depth_spin.value(),
+            'partial_clone': self.partial_clone_check.isChecked(),
+            'sparse_checkout': self.sparse_checkout_check.isChecked(),
+            'repo_layout': self.repo_layout_combo.currentText(),
+            'maintenance_enabled': self.maintenance_check.isChecked(),
+            'maintenance_loose_objects': self.maintenance_loose_spin.value(),
+            'maintenance_max_packs': self.maintenance_packs_spin.value(),
+            'restore_link_mode': self.restore_link_combo.currentText(),
+            'restore_mode': self.restore_mode_combo.currentText(),
+            'profiling': self.profiling_check.isChecked()
         }
 
     def load_settings(self):
-        settings = QSettings("ImageBackupTool", "Settings")
-        self.folder_edit.setText(settings.value("watch_folder", ""))
-        self.repo_edit.setText(settings.value("repo_url", ""))
-        self.format_combo.setCurrentText(settings.value("compression_format", "webp"))
-        self.quality_spin.setValue(int(settings.value("compression_quality", 85)))
-        self.resize_check.setChecked(settings.value("resize_enabled", False, type=bool))
-        self.max_size_spin.setValue(int(settings.value("max_size", 1920)))
+        settings = load_settings()
+        self.folder_edit.setText(settings['watch_folder'])
+        self.repo_edit.setText(settings['repo_url'])
+        self.format_combo.setCurrentText(settings['compression_format'])
+        self.quality_spin.setValue(settings['compression_quality'])
+        self.effort_combo.setCurrentText(settings['effort'])
+        self.time_budget_spin.setValue(settings['time_budget'])
+        self.resize_check.setChecked(settings['resize_enabled'])
+        self.max_size_spin.setValue(settings['max_size'])
+        self.fast_resize_check.setChecked(settings['fast_resize'])
+        self.workers_spin.setValue(settings['workers'])
+        self.chunk_size_spin.setValue(settings['chunk_size'])
+        self.memory_budget_spin.setValue(settings['memory_budget_mb'])
+        self.full_rescan_check.setChecked(settings['full_rescan'])
+        self.watch_stable_spin.setValue(settings['watch_stable_seconds'])
+        self.watch_batch_size_spin.setValue(settings['watch_batch_size'])
+        self.watch_batch_window_spin.setValue(settings['watch_batch_window'])
+        self.cache_max_spin.setValue(settings['cache_max_mb'])
+        self.thumb_cache_spin.setValue(settings['thumbnail_cache_mb'])
+        self.commit_batch_spin.setValue(settings['commit_batch_size'])
+        self.direct_output_check.setChecked(settings['direct_output'])
+        self.commit_batch_mb_spin.setValue(settings['commit_batch_mb'])
+        self.push_each_chunk_check.setChecked(settings['push_each_chunk'])
+        self.background_push_check.setChecked(settings['background_push'])
+        self.push_batch_spin.setValue(settings['push_batch_commits'])
+        self.push_delay_spin.setValue(settings['push_delay'])
+        self.push_backoff_spin.setValue(settings['push_max_backoff'])
+        self.ingest_backend_combo.setCurrentText(settings['ingest_backend'])
+        self.clone_depth_spin.setValue(settings['clone_depth'])
+        self.partial_clone_check.setChecked(settings['partial_clone'])
+        self.sparse_checkout_check.setChecked(settings['sparse_checkout'])
+        self.repo_layout_combo.setCurrentText(settings['repo_layout'])
+        self.maintenance_check.setChecked(settings['maintenance_enabled'])
+        self.maintenance_loose_spin.setValue(settings['maintenance_loose_objects'])
+        self.maintenance_packs_spin.setValue(settings['maintenance_max_packs'])
+        self.restore_link_combo.setCurrentText(settings['restore_link_mode'])
+        self.restore_mode_combo.setCurrentText(settings['restore_mode'])
+        self.profiling_check.setChecked(settings['profiling'])
 
     def save_settings(self):
         settings = QSettings("ImageBackupTool", "Settings")
@@ -83,16 +338,56 @@ class SettingsWidget(QGroupBox):
 
 
 class LogWidget(QGroupBox):
+    """Лог выполнения и прогресс фиксации.
+
+    append_log можно вызывать из любого потока (подключение сигналов с
+    Qt.DirectConnection): сообщение попадает в кольцевой буфер LogBuffer,
+    а в документ строки добавляются одной вставкой раз в FLUSH_INTERVAL_MS.
+    Документ хранит не больше MAX_LINES строк.
+    """
+
+    FLUSH_INTERVAL_MS = 200
+    MAX_LINES = 5000
+
     def __init__(self):
         super().__init__("Лог выполнения")
 
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
         self.log_text.setMaximumHeight(200)
+        self.log_text.setMaximumBlockCount(self.MAX_LINES)
         layout.addWidget(self.log_text)
 
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        progress_layout.addWidget(self.progress_bar)
+        self.progress_label = QLabel()
+        progress_layout.addWidget(self.progress_label)
+        layout.addLayout(progress_layout)
+
+        # Одна строка остается под сообщение о пропущенных
+        self.buffer = LogBuffer(self.MAX_LINES - 1)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(self.FLUSH_INTERVAL_MS)
+
     def append_log(self, message):
-        self.log_text.append(f"{QDateTime.currentDateTime().toString('hh:mm:ss')}: {message}")
\ No newline at end of file
+        self.buffer.emit(message)
+
+    def flush(self):
+        lines, dropped = self.buffer.drain()
+        if dropped:
+            lines.insert(0, f"... пропущено сообщений: {dropped}")
+        if lines:
+            self.log_text.appendPlainText("\n".join(lines))
+
+    def set_progress(self, progress):
+        """Показывает словарь прогресса (см. progress.ProgressTracker)"""
+        self.progress_bar.setVisible(progress['done'] < progress['total'])
+        self.progress_bar.setMaximum(progress['total'])
+        self.progress_bar.setValue(progress['done'])
+        self.progress_label.setText(format_progress(progress))